@@ -7,21 +7,33 @@ Telegram бот для учёта личных расходов
 """
 
 import os
+import re
+import gzip
+import time
+import heapq
+import queue
+import signal
+import asyncio
+import hashlib
+import multiprocessing
 import sqlite3
 import logging
+from collections import OrderedDict
 from datetime import datetime, timedelta
 import calendar
 import pandas as pd
 from io import BytesIO
-from typing import Dict, Any
+from typing import Dict, Any, Callable, List, Optional
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import Forbidden, RetryAfter, TelegramError
 from telegram.ext import (
     Application,
     CommandHandler,
     CallbackQueryHandler,
     MessageHandler,
     ConversationHandler,
+    TypeHandler,
     filters,
     ContextTypes
 )
@@ -35,7 +47,62 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # Состояния для ConversationHandler
-ADD_EXPENSE_NAME, ADD_EXPENSE_AMOUNT = range(2)
+ADD_EXPENSE_NAME, ADD_EXPENSE_AMOUNT, SEARCH_QUERY, SET_BUDGET_AMOUNT = range(4)
+RECURRING_TITLE, RECURRING_AMOUNT, RECURRING_SCHEDULE, RECURRING_DATE = range(4, 8)
+
+# Брошенный диалог завершается через столько секунд
+CONVERSATION_TIMEOUT = 15 * 60
+
+# Количество результатов поиска на одной странице
+SEARCH_PAGE_SIZE = 10
+
+# Пороги бюджета (в процентах), о пересечении которых предупреждаем
+BUDGET_THRESHOLDS = (100, 80)
+
+# Регулярные траты: периодичность, время списания, шаг планировщика и период
+# полной перестройки очереди по базе (сек.), предел догоняемых пропусков на правило
+# и скорость рассылки (сообщений в секунду)
+RECURRING_SCHEDULES = {
+    'monthly': 'ежемесячно',
+    'weekly': 'еженедельно'
+}
+RECURRING_TIME = '09:00:00'
+RECURRING_TICK_SECONDS = 60
+RECURRING_RELOAD_SECONDS = 10 * 60
+RECURRING_MAX_CATCH_UP = 366
+RECURRING_NOTIFY_RATE = 25
+
+# Сводка о регулярных тратах: список обрезается, чтобы уложиться в лимит
+# Telegram на длину сообщения (4096 символов) вместе с итоговой строкой
+RECURRING_SUMMARY_MAX_LENGTH = 3500
+
+# Количество трат на одной странице истории
+HISTORY_PAGE_SIZE = 8
+
+# Подсказки названий трат: размер топа на узле, лимиты памяти и истории.
+# Память ограничена числом узлов деревьев во всём кэше: узел с топом занимает около
+# 400 байт, то есть кэш не больше ~60 МБ. Дерево строится только по первым
+# SUGGEST_PREFIX_DEPTH символам, поэтому одно название добавляет не больше 2 * 12 узлов
+SUGGEST_TOP_SIZE = 6
+SUGGEST_PREFIX_DEPTH = 12
+SUGGEST_MAX_NODES = 150_000
+SUGGEST_MAX_USERS = 1000
+SUGGEST_IDLE_SECONDS = 6 * 60 * 60
+SUGGEST_HISTORY_LIMIT = 1000
+
+# Резервные копии: страниц за шаг онлайн-копирования и пауза между шагами (сек.)
+BACKUP_PAGES_PER_STEP = 64
+BACKUP_STEP_SLEEP = 0.005
+BACKUP_PREFIX = 'expenses-'
+BACKUP_SUFFIX = '.db.gz'
+
+# Режим нескольких процессов: сколько ждать обработчики при остановке (сек.)
+# и как часто проверять, что они живы (основной — обработчиков, обработчики — основной)
+WORKER_DRAIN_TIMEOUT = 30
+WORKER_CHECK_INTERVAL = 10
+
+# Процессы-обработчики запускаются «с нуля», без копии памяти основного процесса
+MP_CONTEXT = multiprocessing.get_context('spawn')
 
 # Категории расходов
 CATEGORIES = {
@@ -47,9 +114,246 @@ CATEGORIES = {
     'subscriptions': '🔔 Подписки'
 }
 
+class TitleEntry:
+    """Известное название траты пользователя со статистикой использования"""
+    __slots__ = ('entry_id', 'title', 'category', 'count', 'last_amount', 'last_seq')
+    
+    def __init__(self, entry_id: str, title: str, category: str):
+        self.entry_id = entry_id
+        self.title = title
+        self.category = category
+        self.count = 0
+        self.last_amount = 0.0
+        self.last_seq = 0
+    
+    def rank(self):
+        return self.count, self.last_seq
+
+def title_entry_id(category: str, title: str) -> str:
+    """Постоянный короткий ключ названия для callback_data: не меняется при перестройке индекса"""
+    key = f"{category}:{title.strip().lower()}"
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:10]
+
+class TitleTrieNode:
+    """Узел префиксного дерева: дети по символу и готовый топ названий под узлом"""
+    __slots__ = ('children', 'top')
+    
+    def __init__(self):
+        self.children = {}
+        self.top = []
+
+class UserTitleIndex:
+    """Частые названия трат одного пользователя (общее дерево и дерево на каждую категорию)"""
+    
+    def __init__(self):
+        self.entries = {}
+        self.by_id = {}
+        self.roots = {}
+        self.nodes = 0
+        self.seq = 0
+        self.last_used = time.monotonic()
+    
+    def record(self, category: str, title: str, amount: float):
+        """Учесть трату: обновить счётчик и топы на пути от корня до названия"""
+        key = title.strip().lower()
+        entry = self.entries.get((category, key))
+        if entry is None:
+            entry = TitleEntry(title_entry_id(category, title), title.strip(), category)
+            self.entries[(category, key)] = entry
+            self.by_id.setdefault(entry.entry_id, entry)
+        
+        self.seq += 1
+        entry.count += 1
+        entry.last_amount = amount
+        entry.last_seq = self.seq
+        
+        for root_key in (None, category):
+            node = self._child(self.roots, root_key)
+            self._promote(node, entry)
+            for char in key[:SUGGEST_PREFIX_DEPTH]:
+                node = self._child(node.children, char)
+                self._promote(node, entry)
+    
+    def _child(self, children: dict, key) -> TitleTrieNode:
+        node = children.get(key)
+        if node is None:
+            node = children[key] = TitleTrieNode()
+            self.nodes += 1
+        return node
+    
+    @staticmethod
+    def _promote(node: TitleTrieNode, entry: TitleEntry):
+        """Счётчики только растут, поэтому топ узла достаточно поправить на месте"""
+        if entry not in node.top:
+            if len(node.top) < SUGGEST_TOP_SIZE:
+                node.top.append(entry)
+            elif entry.rank() > node.top[-1].rank():
+                node.top[-1] = entry
+            else:
+                return
+        node.top.sort(key=TitleEntry.rank, reverse=True)
+    
+    def suggest(self, prefix: str = '', category: str = None) -> List[TitleEntry]:
+        """Топ названий с заданным префиксом — O(длины префикса)"""
+        prefix = prefix.strip().lower()
+        node = self.roots.get(category)
+        for char in prefix[:SUGGEST_PREFIX_DEPTH]:
+            if node is None:
+                break
+            node = node.children.get(char)
+        if node is None:
+            return []
+        
+        # Глубже дерева не строится: остаток префикса проверяем по топу узла
+        if len(prefix) > SUGGEST_PREFIX_DEPTH:
+            return [entry for entry in node.top if entry.title.lower().startswith(prefix)]
+        return list(node.top)
+    
+    def find(self, category: str, title: str) -> Optional[TitleEntry]:
+        return self.entries.get((category, title.strip().lower()))
+
+class TitleSuggestions:
+    """Кэш индексов названий: строится из базы при первом обращении, вытесняет неактивных пользователей"""
+    
+    def __init__(self, loader: Callable[[int], list]):
+        self.loader = loader
+        self.users = OrderedDict()
+        self.nodes = 0
+    
+    def get_index(self, user_id: int) -> UserTitleIndex:
+        index = self.users.get(user_id)
+        if index is None:
+            index = UserTitleIndex()
+            for category, title, amount in self.loader(user_id):
+                index.record(category, title, amount)
+            self.users[user_id] = index
+            self.nodes += index.nodes
+        
+        self.users.move_to_end(user_id)
+        index.last_used = time.monotonic()
+        self.evict()
+        return index
+    
+    def evict(self):
+        """Удалить самых давно неактивных пользователей сверх лимитов (узлов и пользователей) или по таймауту.
+        
+        Последний активный пользователь остаётся в кэше, даже если один превышает лимит узлов.
+        """
+        idle_before = time.monotonic() - SUGGEST_IDLE_SECONDS
+        while len(self.users) > 1:
+            user_id, index = next(iter(self.users.items()))
+            if (len(self.users) <= SUGGEST_MAX_USERS and self.nodes <= SUGGEST_MAX_NODES
+                    and index.last_used >= idle_before):
+                break
+            self.invalidate(user_id)
+    
+    def record(self, user_id: int, category: str, title: str, amount: float):
+        # Если индекс ещё не построен, трата попадёт в него из базы при первом обращении
+        index = self.users.get(user_id)
+        if index is not None:
+            nodes = index.nodes
+            index.record(category, title, amount)
+            self.nodes += index.nodes - nodes
+            self.evict()
+    
+    def invalidate(self, user_id: int):
+        index = self.users.pop(user_id, None)
+        if index is not None:
+            self.nodes -= index.nodes
+    
+    def clear(self):
+        self.users.clear()
+        self.nodes = 0
+    
+    def suggest(self, user_id: int, prefix: str = '', category: str = None) -> List[TitleEntry]:
+        return self.get_index(user_id).suggest(prefix, category)
+    
+    def find(self, user_id: int, category: str, title: str) -> Optional[TitleEntry]:
+        return self.get_index(user_id).find(category, title)
+    
+    def get_entry(self, user_id: int, entry_id: str) -> Optional[TitleEntry]:
+        """Название по ключу из кнопки; None, если такого названия у пользователя больше нет"""
+        entry = self.get_index(user_id).by_id.get(entry_id)
+        if entry is None or title_entry_id(entry.category, entry.title) != entry_id:
+            return None
+        return entry
+
+class RecurringScheduler:
+    """Очередь сроков регулярных трат: одна куча (срок, ID правила) вместо задачи на каждое правило.
+    
+    В режиме нескольких процессов каждый обработчик ведёт только правила своих пользователей.
+    Работа с базой идёт в отдельном потоке, а куча меняется только в цикле событий.
+    Очередь периодически перестраивается по базе целиком — так правила из восстановленной
+    копии подхватываются и теми обработчиками, которые не выполняли /restore.
+    """
+    
+    def __init__(self, bot: 'ExpenseBot', shard: int = 0, shards: int = 1):
+        self.bot = bot
+        self.shard = shard
+        self.shards = shards
+        self.heap = []
+        self.pending = []
+        self.loaded = False
+        self.loading = False
+        self.loaded_at = 0.0
+    
+    def owns(self, user_id: int) -> bool:
+        return worker_for_user(user_id, self.shards) == self.shard
+    
+    async def load(self):
+        """Построить очередь по базе (при первом шаге и затем периодически)"""
+        self.pending = []
+        self.loading = True
+        try:
+            rules = await asyncio.to_thread(self.bot.get_recurring_schedule)
+        finally:
+            self.loading = False
+        
+        # Правила, добавленные во время чтения базы (в том числе при перестройке),
+        # копятся в pending и попадают в новую очередь, а не в заменяемую
+        self.heap = [
+            (next_due, rule_id) for next_due, rule_id, user_id in rules if self.owns(user_id)
+        ] + self.pending
+        heapq.heapify(self.heap)
+        self.pending = []
+        self.loaded = True
+        self.loaded_at = time.monotonic()
+    
+    def schedule(self, rule_id: int, next_due: str):
+        if self.loaded and not self.loading:
+            heapq.heappush(self.heap, (next_due, rule_id))
+        else:
+            self.pending.append((next_due, rule_id))
+    
+    async def tick(self, now: datetime) -> list:
+        """Создать траты по всем наступившим срокам. Возвращает созданные траты"""
+        if not self.loaded or time.monotonic() - self.loaded_at >= RECURRING_RELOAD_SECONDS:
+            await self.load()
+        
+        now_str = now.strftime('%Y-%m-%d %H:%M:%S')
+        due_ids = set()
+        while self.heap and self.heap[0][0] <= now_str:
+            due_ids.add(heapq.heappop(self.heap)[1])
+        
+        if not due_ids:
+            return []
+        
+        # Удалённые правила просто не возвращаются из базы и выпадают из очереди
+        created, next_dues = await asyncio.to_thread(
+            self.bot.materialize_recurring, sorted(due_ids), now
+        )
+        for rule_id, next_due in next_dues.items():
+            heapq.heappush(self.heap, (next_due, rule_id))
+        
+        for user_id, category, title, amount, _ in created:
+            self.bot.suggestions.record(user_id, category, title, amount)
+        
+        return created
+
 class ExpenseBot:
     def __init__(self):
         self.db_path = 'expenses.db'
+        self.suggestions = TitleSuggestions(self.get_recent_titles)
         self.init_database()
     
     def init_database(self):
@@ -57,6 +361,9 @@ class ExpenseBot:
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
+        # WAL: читатели (в том числе резервное копирование) не блокируют запись
+        cursor.execute('PRAGMA journal_mode=WAL')
+        
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS expenses (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -68,27 +375,154 @@ class ExpenseBot:
             )
         ''')
         
+        # Индексы для курсорной (keyset) пагинации истории и выборок за период
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_expenses_user_time
+            ON expenses (user_id, timestamp, id)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_expenses_user_category_time
+            ON expenses (user_id, category, timestamp, id)
+        ''')
+        
+        # Бюджеты на месяц и накопительные суммы трат по месяцам и категориям
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS budgets (
+                user_id INTEGER NOT NULL,
+                category TEXT NOT NULL,
+                amount REAL NOT NULL,
+                PRIMARY KEY (user_id, category)
+            )
+        ''')
+        
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'monthly_totals'"
+        )
+        totals_exist = cursor.fetchone() is not None
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS monthly_totals (
+                user_id INTEGER NOT NULL,
+                month TEXT NOT NULL,
+                category TEXT NOT NULL,
+                spent REAL NOT NULL,
+                PRIMARY KEY (user_id, month, category)
+            )
+        ''')
+        
+        # Триггеры обновляют суммы при каждой записи, поэтому пересчитывать SUM по тратам не нужно
+        cursor.executescript('''
+            CREATE TRIGGER IF NOT EXISTS monthly_totals_insert AFTER INSERT ON expenses BEGIN
+                INSERT INTO monthly_totals (user_id, month, category, spent)
+                VALUES (new.user_id, substr(new.timestamp, 1, 7), new.category, new.amount)
+                ON CONFLICT (user_id, month, category) DO UPDATE SET spent = spent + excluded.spent;
+            END;
+            CREATE TRIGGER IF NOT EXISTS monthly_totals_delete AFTER DELETE ON expenses BEGIN
+                UPDATE monthly_totals SET spent = spent - old.amount
+                WHERE user_id = old.user_id AND month = substr(old.timestamp, 1, 7) AND category = old.category;
+            END;
+            CREATE TRIGGER IF NOT EXISTS monthly_totals_update AFTER UPDATE OF category, amount, timestamp ON expenses BEGIN
+                UPDATE monthly_totals SET spent = spent - old.amount
+                WHERE user_id = old.user_id AND month = substr(old.timestamp, 1, 7) AND category = old.category;
+                INSERT INTO monthly_totals (user_id, month, category, spent)
+                VALUES (new.user_id, substr(new.timestamp, 1, 7), new.category, new.amount)
+                ON CONFLICT (user_id, month, category) DO UPDATE SET spent = spent + excluded.spent;
+            END;
+        ''')
+        
+        # Для уже существующей базы считаем суммы один раз
+        if not totals_exist:
+            cursor.execute('''
+                INSERT INTO monthly_totals (user_id, month, category, spent)
+                SELECT user_id, substr(timestamp, 1, 7), category, SUM(amount) FROM expenses
+                GROUP BY user_id, substr(timestamp, 1, 7), category
+            ''')
+        
+        # Правила регулярных трат (подписки и т.п.) со сроком ближайшего списания
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS recurring_expenses (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                category TEXT NOT NULL,
+                title TEXT NOT NULL,
+                amount REAL NOT NULL,
+                schedule TEXT NOT NULL,
+                anchor_day INTEGER NOT NULL,
+                next_due TEXT NOT NULL
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_recurring_user
+            ON recurring_expenses (user_id, category)
+        ''')
+        
+        # Полнотекстовый индекс по названиям трат (внешний контент — таблица expenses).
+        # user_id тоже индексируется, чтобы поиск сразу ограничивался трат пользователя
+        cursor.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'expenses_fts'"
+        )
+        row = cursor.fetchone()
+        fts_exists = row is not None and 'user_id' in row[0]
+        
+        # Индекс старого формата (только title) пересоздаём
+        if row is not None and not fts_exists:
+            cursor.executescript('''
+                DROP TRIGGER IF EXISTS expenses_fts_insert;
+                DROP TRIGGER IF EXISTS expenses_fts_delete;
+                DROP TRIGGER IF EXISTS expenses_fts_update;
+                DROP TABLE expenses_fts;
+            ''')
+        
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS expenses_fts USING fts5(
+                user_id,
+                title,
+                content='expenses',
+                content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2',
+                prefix='1 2 3'
+            )
+        ''')
+        
+        # Триггеры держат индекс в синхронизации с таблицей трат
+        cursor.executescript('''
+            CREATE TRIGGER IF NOT EXISTS expenses_fts_insert AFTER INSERT ON expenses BEGIN
+                INSERT INTO expenses_fts(rowid, user_id, title) VALUES (new.id, new.user_id, new.title);
+            END;
+            CREATE TRIGGER IF NOT EXISTS expenses_fts_delete AFTER DELETE ON expenses BEGIN
+                INSERT INTO expenses_fts(expenses_fts, rowid, user_id, title)
+                VALUES ('delete', old.id, old.user_id, old.title);
+            END;
+            CREATE TRIGGER IF NOT EXISTS expenses_fts_update AFTER UPDATE OF user_id, title ON expenses BEGIN
+                INSERT INTO expenses_fts(expenses_fts, rowid, user_id, title)
+                VALUES ('delete', old.id, old.user_id, old.title);
+                INSERT INTO expenses_fts(rowid, user_id, title) VALUES (new.id, new.user_id, new.title);
+            END;
+        ''')
+        
+        # Для уже существующей базы строим индекс по накопленным тратам
+        if not fts_exists:
+            cursor.execute("INSERT INTO expenses_fts(expenses_fts) VALUES ('rebuild')")
+        
         conn.commit()
         conn.close()
         logger.info("База данных инициализирована")
     
     def get_monthly_total(self, user_id: int) -> float:
-        """Получить общую сумму трат за текущий месяц"""
-        now = datetime.now()
-        start_of_month = datetime(now.year, now.month, 1)
-        
+        """Получить общую сумму трат за текущий месяц (по накопительным суммам категорий)"""
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
         cursor.execute('''
-            SELECT SUM(amount) FROM expenses 
-            WHERE user_id = ? AND timestamp >= ?
-        ''', (user_id, start_of_month.strftime('%Y-%m-%d %H:%M:%S')))
+            SELECT SUM(spent) FROM monthly_totals
+            WHERE user_id = ? AND month = ?
+        ''', (user_id, datetime.now().strftime('%Y-%m')))
         
         result = cursor.fetchone()[0]
         conn.close()
         
-        return result if result else 0.0
+        # Суммы копятся сложением и вычитанием, округляем до копеек
+        return round(result, 2) if result else 0.0
     
     def add_expense(self, user_id: int, category: str, title: str, amount: float):
         """Добавить трату"""
@@ -104,6 +538,196 @@ class ExpenseBot:
         
         conn.commit()
         conn.close()
+        
+        self.suggestions.record(user_id, category, title, amount)
+    
+    def set_budget(self, user_id: int, category: str, amount: float):
+        """Задать бюджет категории на месяц (0 — убрать бюджет)"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        if amount > 0:
+            cursor.execute('''
+                INSERT INTO budgets (user_id, category, amount) VALUES (?, ?, ?)
+                ON CONFLICT (user_id, category) DO UPDATE SET amount = excluded.amount
+            ''', (user_id, category, amount))
+        else:
+            cursor.execute(
+                'DELETE FROM budgets WHERE user_id = ? AND category = ?', (user_id, category)
+            )
+        
+        conn.commit()
+        conn.close()
+    
+    def get_budget_status(self, user_id: int, category: str):
+        """Бюджет категории и сумма трат за текущий месяц: (лимит, потрачено) или None"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT b.amount, COALESCE(t.spent, 0) FROM budgets b
+            LEFT JOIN monthly_totals t
+                ON t.user_id = b.user_id AND t.month = ? AND t.category = b.category
+            WHERE b.user_id = ? AND b.category = ?
+        ''', (datetime.now().strftime('%Y-%m'), user_id, category))
+        
+        result = cursor.fetchone()
+        conn.close()
+        
+        return result
+    
+    def get_budgets_status(self, user_id: int) -> list:
+        """Все бюджеты пользователя с суммами за текущий месяц: [(категория, лимит, потрачено)]"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT b.category, b.amount, COALESCE(t.spent, 0) FROM budgets b
+            LEFT JOIN monthly_totals t
+                ON t.user_id = b.user_id AND t.month = ? AND t.category = b.category
+            WHERE b.user_id = ?
+        ''', (datetime.now().strftime('%Y-%m'), user_id))
+        
+        result = cursor.fetchall()
+        conn.close()
+        
+        return result
+    
+    def add_recurring(self, user_id: int, category: str, title: str, amount: float,
+                      schedule: str, first_due: datetime) -> tuple:
+        """Добавить правило регулярной траты. Возвращает (ID правила, срок первого списания)"""
+        next_due = first_due.strftime('%Y-%m-%d %H:%M:%S')
+        
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            INSERT INTO recurring_expenses (user_id, category, title, amount, schedule, anchor_day, next_due)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (user_id, category, title, amount, schedule, first_due.day, next_due))
+        
+        rule_id = cursor.lastrowid
+        conn.commit()
+        conn.close()
+        
+        return rule_id, next_due
+    
+    def get_recurring_rules(self, user_id: int, category: str) -> list:
+        """Правила регулярных трат пользователя в категории"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT id, title, amount, schedule, next_due FROM recurring_expenses
+            WHERE user_id = ? AND category = ?
+            ORDER BY next_due
+        ''', (user_id, category))
+        
+        result = cursor.fetchall()
+        conn.close()
+        
+        return result
+    
+    def delete_recurring(self, rule_id: int, user_id: int) -> bool:
+        """Удалить правило регулярной траты (с проверкой принадлежности пользователю)"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute(
+            'DELETE FROM recurring_expenses WHERE id = ? AND user_id = ?', (rule_id, user_id)
+        )
+        
+        deleted = cursor.rowcount > 0
+        conn.commit()
+        conn.close()
+        
+        return deleted
+    
+    def get_recurring_schedule(self) -> list:
+        """Сроки всех правил для построения очереди планировщика: [(срок, ID, user_id)]"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute('SELECT next_due, id, user_id FROM recurring_expenses')
+        
+        result = cursor.fetchall()
+        conn.close()
+        
+        return result
+    
+    def materialize_recurring(self, rule_ids: list, now: datetime) -> tuple:
+        """Создать траты по всем наступившим срокам правил одной транзакцией.
+        
+        Срок правила сдвигается условным UPDATE (только если он не изменился),
+        поэтому повторный запуск не создаёт дубликатов. Возвращает
+        (созданные траты [(user_id, category, title, amount, timestamp)], {ID правила: новый срок})
+        """
+        if not rule_ids:
+            return [], {}
+        
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        placeholders = ', '.join('?' for _ in rule_ids)
+        cursor.execute(f'''
+            SELECT id, user_id, category, title, amount, schedule, anchor_day, next_due
+            FROM recurring_expenses WHERE id IN ({placeholders})
+        ''', list(rule_ids))
+        
+        created = []
+        next_dues = {}
+        
+        for rule_id, user_id, category, title, amount, schedule, anchor_day, next_due in cursor.fetchall():
+            due = datetime.strptime(next_due, '%Y-%m-%d %H:%M:%S')
+            occurrences = []
+            
+            # Догоняем все пропущенные сроки (например, после простоя бота)
+            while due <= now and len(occurrences) < RECURRING_MAX_CATCH_UP:
+                occurrences.append(due.strftime('%Y-%m-%d %H:%M:%S'))
+                due = next_recurring_due(due, schedule, anchor_day)
+            
+            new_due = due.strftime('%Y-%m-%d %H:%M:%S')
+            next_dues[rule_id] = new_due
+            if not occurrences:
+                continue
+            
+            cursor.execute('''
+                UPDATE recurring_expenses SET next_due = ?
+                WHERE id = ? AND next_due = ?
+            ''', (new_due, rule_id, next_due))
+            
+            if cursor.rowcount:
+                created.extend(
+                    (user_id, category, title, amount, timestamp) for timestamp in occurrences
+                )
+        
+        cursor.executemany('''
+            INSERT INTO expenses (user_id, category, title, amount, timestamp)
+            VALUES (?, ?, ?, ?, ?)
+        ''', created)
+        
+        conn.commit()
+        conn.close()
+        
+        return created, next_dues
+    
+    def get_recent_titles(self, user_id: int, limit: int = SUGGEST_HISTORY_LIMIT) -> list:
+        """Последние траты пользователя (от старых к новым) для построения подсказок"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT category, title, amount FROM expenses
+            WHERE user_id = ?
+            ORDER BY id DESC
+            LIMIT ?
+        ''', (user_id, limit))
+        
+        result = cursor.fetchall()
+        conn.close()
+        
+        result.reverse()
+        return result
     
     def get_today_expenses(self, user_id: int, category: str) -> list:
         """Получить траты за сегодня в определённой категории"""
@@ -123,6 +747,64 @@ class ExpenseBot:
         
         return result
     
+    def get_expenses_page(self, user_id: int, category: str = None, before: tuple = None,
+                          after: tuple = None, limit: int = HISTORY_PAGE_SIZE) -> Dict[str, Any]:
+        """Страница истории трат от новых к старым по курсору (timestamp, id) вместо OFFSET"""
+        conditions = ['user_id = ?']
+        params = [user_id]
+        
+        if category:
+            conditions.append('category = ?')
+            params.append(category)
+        
+        if after:
+            conditions.append('(timestamp, id) > (?, ?)')
+            params.extend(after)
+            order = 'ASC'
+        else:
+            if before:
+                conditions.append('(timestamp, id) < (?, ?)')
+                params.extend(before)
+            order = 'DESC'
+        
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        # Берём на одну строку больше, чтобы узнать, есть ли следующая страница
+        cursor.execute(f'''
+            SELECT id, category, title, amount, timestamp FROM expenses
+            WHERE {' AND '.join(conditions)}
+            ORDER BY timestamp {order}, id {order}
+            LIMIT ?
+        ''', params + [limit + 1])
+        
+        rows = cursor.fetchall()
+        conn.close()
+        
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        
+        if after:
+            rows.reverse()
+            return {'rows': rows, 'has_newer': has_more, 'has_older': True}
+        
+        return {'rows': rows, 'has_newer': before is not None, 'has_older': has_more}
+    
+    def get_expense(self, expense_id: int, user_id: int):
+        """Получить трату по ID (с проверкой принадлежности пользователю)"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT id, category, title, amount, timestamp FROM expenses
+            WHERE id = ? AND user_id = ?
+        ''', (expense_id, user_id))
+        
+        result = cursor.fetchone()
+        conn.close()
+        
+        return result
+    
     def delete_expense(self, expense_id: int, user_id: int) -> bool:
         """Удалить трату (с проверкой принадлежности пользователю)"""
         conn = sqlite3.connect(self.db_path)
@@ -136,6 +818,9 @@ class ExpenseBot:
         conn.commit()
         conn.close()
         
+        if deleted:
+            self.suggestions.invalidate(user_id)
+        
         return deleted
     
     def delete_all_expenses(self, user_id: int):
@@ -144,9 +829,12 @@ class ExpenseBot:
         cursor = conn.cursor()
         
         cursor.execute('DELETE FROM expenses WHERE user_id = ?', (user_id,))
+        cursor.execute('DELETE FROM monthly_totals WHERE user_id = ?', (user_id,))
         
         conn.commit()
         conn.close()
+        
+        self.suggestions.invalidate(user_id)
     
     def get_expenses_report(self, user_id: int, start_date: datetime, end_date: datetime) -> Dict[str, Any]:
         """Получить отчёт по тратам за период"""
@@ -179,6 +867,157 @@ class ExpenseBot:
             'end_date': end_date
         }
     
+    def search_expenses(self, user_id: int, text: str, category: str = None,
+                        start_date: datetime = None, end_date: datetime = None,
+                        limit: int = SEARCH_PAGE_SIZE, offset: int = 0) -> Dict[str, Any]:
+        """Поиск трат по названию (FTS5, с префиксным совпадением слов)"""
+        match = build_fts_query(text)
+        if not match:
+            return {'rows': [], 'count': 0, 'total': 0.0}
+        
+        # Совпадения ищутся только среди трат пользователя: user_id — отдельный термин индекса.
+        # CROSS JOIN оставляет FTS внешним циклом: иначе планировщик идёт по индексу
+        # expenses(user_id, ...) и проверяет MATCH для каждой строки отдельно
+        conditions = ['expenses_fts MATCH ?', 'e.user_id = ?']
+        params = [f'user_id:"{user_id}" AND title:({match})', user_id]
+        
+        if category:
+            conditions.append('e.category = ?')
+            params.append(category)
+        if start_date:
+            conditions.append('e.timestamp >= ?')
+            params.append(start_date.strftime('%Y-%m-%d %H:%M:%S'))
+        if end_date:
+            conditions.append('e.timestamp <= ?')
+            params.append(end_date.strftime('%Y-%m-%d %H:%M:%S'))
+        
+        where = ' AND '.join(conditions)
+        
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute(f'''
+            SELECT COUNT(*), SUM(e.amount) FROM expenses_fts
+            CROSS JOIN expenses e ON e.id = expenses_fts.rowid
+            WHERE {where}
+        ''', params)
+        
+        count, total = cursor.fetchone()
+        
+        cursor.execute(f'''
+            SELECT e.id, e.category, e.title, e.amount, e.timestamp FROM expenses_fts
+            CROSS JOIN expenses e ON e.id = expenses_fts.rowid
+            WHERE {where}
+            ORDER BY e.timestamp DESC, e.id DESC
+            LIMIT ? OFFSET ?
+        ''', params + [limit, offset])
+        
+        rows = cursor.fetchall()
+        conn.close()
+        
+        return {
+            'rows': rows,
+            'count': count,
+            'total': total or 0.0
+        }
+    
+    def backup_database(self, backup_dir: str, keep: int) -> str:
+        """Онлайн-копия базы по частям, сжатая и с контрольной суммой. Возвращает имя снимка"""
+        if keep < 1:
+            raise ValueError("Нужно хранить хотя бы одну резервную копию (keep >= 1)")
+        
+        os.makedirs(backup_dir, exist_ok=True)
+        
+        # Микросекунды в имени: две копии в одну секунду не перезаписывают друг друга
+        name = f"{BACKUP_PREFIX}{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}{BACKUP_SUFFIX}"
+        path = os.path.join(backup_dir, name)
+        tmp_db = path + '.tmp.db'
+        tmp_gz = path + '.tmp'
+        
+        # Копируем по BACKUP_PAGES_PER_STEP страниц с паузами между шагами.
+        # Открытая читающая транзакция фиксирует снимок WAL: запись трат не ждёт копию,
+        # а копия не начинается заново после каждой новой траты
+        source = sqlite3.connect(self.db_path, isolation_level=None)
+        target = sqlite3.connect(tmp_db)
+        try:
+            source.execute('BEGIN')
+            source.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()
+            source.backup(target, pages=BACKUP_PAGES_PER_STEP, sleep=BACKUP_STEP_SLEEP)
+            source.execute('COMMIT')
+        finally:
+            target.close()
+            source.close()
+        
+        digest = hashlib.sha256()
+        try:
+            with open(tmp_db, 'rb') as src, gzip.open(tmp_gz, 'wb') as dst:
+                for chunk in iter(lambda: src.read(1 << 20), b''):
+                    digest.update(chunk)
+                    dst.write(chunk)
+        finally:
+            os.remove(tmp_db)
+        
+        os.replace(tmp_gz, path)
+        with open(path + '.sha256', 'w') as f:
+            f.write(f"{digest.hexdigest()}  {name}\n")
+        
+        # Оставляем только последние keep снимков
+        for old_name in self.list_backups(backup_dir)[keep:]:
+            old_path = os.path.join(backup_dir, old_name)
+            os.remove(old_path)
+            if os.path.exists(old_path + '.sha256'):
+                os.remove(old_path + '.sha256')
+        
+        logger.info(f"Резервная копия создана: {name}")
+        return name
+    
+    def list_backups(self, backup_dir: str) -> list:
+        """Имена снимков, от новых к старым"""
+        if not os.path.isdir(backup_dir):
+            return []
+        
+        return sorted(
+            (name for name in os.listdir(backup_dir)
+             if name.startswith(BACKUP_PREFIX) and name.endswith(BACKUP_SUFFIX)),
+            reverse=True
+        )
+    
+    def restore_database(self, backup_dir: str, name: str):
+        """Восстановить базу из снимка (с проверкой контрольной суммы)"""
+        if name not in self.list_backups(backup_dir):
+            raise ValueError(f"Снимок {name} не найден")
+        
+        path = os.path.join(backup_dir, name)
+        with open(path + '.sha256') as f:
+            expected = f.read().split()[0]
+        
+        tmp_db = path + '.restore.db'
+        digest = hashlib.sha256()
+        try:
+            with gzip.open(path, 'rb') as src, open(tmp_db, 'wb') as dst:
+                for chunk in iter(lambda: src.read(1 << 20), b''):
+                    digest.update(chunk)
+                    dst.write(chunk)
+            
+            if digest.hexdigest() != expected:
+                raise ValueError(f"Контрольная сумма снимка {name} не совпадает")
+            
+            # Копируем снимок поверх рабочей базы тем же backup API — без замены файла под открытыми соединениями
+            source = sqlite3.connect(tmp_db)
+            target = sqlite3.connect(self.db_path)
+            try:
+                source.backup(target)
+            finally:
+                target.close()
+                source.close()
+        finally:
+            if os.path.exists(tmp_db):
+                os.remove(tmp_db)
+        
+        self.init_database()
+        self.suggestions.clear()
+        logger.info(f"База восстановлена из снимка {name}")
+    
     def export_expenses_to_excel(self, user_id: int, start_date: datetime, end_date: datetime) -> BytesIO:
         """Экспорт трат в Excel файл с отдельными листами для каждой категории"""
         conn = sqlite3.connect(self.db_path)
@@ -226,13 +1065,120 @@ class ExpenseBot:
         output.seek(0)
         return output
 
+def build_fts_query(text: str) -> str:
+    """Превратить пользовательский запрос в выражение FTS5: все слова, каждое — как префикс"""
+    words = re.findall(r'\w+', text.lower())[:8]
+    return ' '.join(f'"{word}"*' for word in words)
+
+def encode_history_cursor(category: Optional[str], timestamp: str, expense_id: int) -> str:
+    """Компактный курсор страницы для callback_data: код категории, секунды и ID в base36.
+    
+    Категория кодируется номером в CATEGORIES ('-' — все категории), чтобы старые
+    кнопки листали ту же историю независимо от состояния user_data.
+    """
+    code = to_base36(list(CATEGORIES).index(category)) if category else '-'
+    seconds = calendar.timegm(datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S').timetuple())
+    return f"{code}_{to_base36(seconds)}_{to_base36(expense_id)}"
+
+def decode_history_cursor(token: str) -> tuple:
+    """Обратное преобразование курсора в (категория, (timestamp, id))"""
+    code, seconds, expense_id = token.split('_')
+    category = None if code == '-' else list(CATEGORIES)[int(code, 36)]
+    timestamp = datetime(1970, 1, 1) + timedelta(seconds=int(seconds, 36))
+    return category, (timestamp.strftime('%Y-%m-%d %H:%M:%S'), int(expense_id, 36))
+
+def to_base36(number: int) -> str:
+    digits = '0123456789abcdefghijklmnopqrstuvwxyz'
+    result = ''
+    while True:
+        number, remainder = divmod(number, 36)
+        result = digits[remainder] + result
+        if number == 0:
+            return result
+
+def next_recurring_due(due: datetime, schedule: str, anchor_day: int) -> datetime:
+    """Следующий срок списания. Для ежемесячных — тот же день месяца (или последний, если его нет)"""
+    if schedule == 'weekly':
+        return due + timedelta(days=7)
+    
+    year, month = (due.year + 1, 1) if due.month == 12 else (due.year, due.month + 1)
+    day = min(anchor_day, calendar.monthrange(year, month)[1])
+    return due.replace(year=year, month=month, day=day)
+
+def budget_threshold_crossed(limit: float, spent: float, amount: float) -> Optional[int]:
+    """Какой порог бюджета (в процентах) пересекла трата amount, если пересекла"""
+    before = spent - amount
+    for threshold in BUDGET_THRESHOLDS:
+        if before < limit * threshold / 100 <= spent:
+            return threshold
+    return None
+
+def format_budgets_status(user_id: int) -> str:
+    """Строки с состоянием бюджетов на месяц для главного меню"""
+    budgets = expense_bot.get_budgets_status(user_id)
+    if not budgets:
+        return ''
+    
+    message = "\n\n🎯 Бюджеты на месяц:"
+    for category, limit, spent in budgets:
+        mark = "🚨" if spent >= limit else "⚠️" if spent >= limit * 0.8 else "▫️"
+        message += (
+            f"\n{mark} {CATEGORIES.get(category, category)}: "
+            f"{spent:.0f} из {limit:.0f} ₽ ({spent / limit * 100:.0f}%)"
+        )
+    return message
+
+def format_recurring_summary(items: list) -> str:
+    """Сводка добавленных регулярных трат: первые строки списка и итог по остальным"""
+    message = "🔁 Добавлены регулярные траты:\n"
+    shown = 0
+    for title, amount, timestamp in items:
+        date = datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S').strftime('%d.%m.%Y')
+        line = f"\n{date} — {title} — {amount:.0f} ₽"
+        if len(message) + len(line) > RECURRING_SUMMARY_MAX_LENGTH:
+            break
+        message += line
+        shown += 1
+    
+    if shown < len(items):
+        rest = sum(amount for _, amount, _ in items[shown:])
+        message += f"\n…и ещё {len(items) - shown} на {rest:.0f} ₽"
+        message += f"\n\nВсего: {len(items)} на {sum(amount for _, amount, _ in items):.0f} ₽"
+    return message
+
+def get_period_range(period: str):
+    """Начало, конец и название периода для отчётов, выгрузки и поиска"""
+    now = datetime.now()
+    
+    if period == 'day':
+        return datetime(now.year, now.month, now.day), now, "день"
+    elif period == 'week':
+        return now - timedelta(days=7), now, "неделю"
+    elif period == 'month':
+        return datetime(now.year, now.month, 1), now, "месяц"
+    else:  # all
+        return datetime(2020, 1, 1), now, "всё время"
+
 # Инициализируем бота
 expense_bot = ExpenseBot()
 
 # Функции для создания клавиатур
-def get_main_menu_keyboard():
-    """Главное меню"""
-    keyboard = [
+def get_main_menu_keyboard(user_id: int = None):
+    """Главное меню (с кнопками быстрого добавления частых трат, если известен пользователь)"""
+    keyboard = []
+    
+    if user_id is not None:
+        frequent = [entry for entry in expense_bot.suggestions.suggest(user_id) if entry.count > 1][:4]
+        quick_buttons = [
+            InlineKeyboardButton(
+                f"⚡ {entry.title} · {entry.last_amount:.0f} ₽",
+                callback_data=f"quick_{entry.entry_id}"
+            )
+            for entry in frequent
+        ]
+        keyboard.extend(quick_buttons[i:i + 2] for i in range(0, len(quick_buttons), 2))
+    
+    keyboard += [
         [InlineKeyboardButton("🍽️ Еда дома", callback_data="category_food_home"),
          InlineKeyboardButton("🍕 Еда на улице", callback_data="category_food_out")],
         [InlineKeyboardButton("🚇 Транспорт", callback_data="category_transport"),
@@ -241,15 +1187,38 @@ def get_main_menu_keyboard():
          InlineKeyboardButton("🔔 Подписки", callback_data="category_subscriptions")],
         [InlineKeyboardButton("📊 Отчёт", callback_data="report"),
          InlineKeyboardButton("📥 Выгрузить траты", callback_data="export")],
+        [InlineKeyboardButton("🗂 История", callback_data="history"),
+         InlineKeyboardButton("🔍 Поиск", callback_data="search")],
         [InlineKeyboardButton("❌ Удалить все траты", callback_data="delete_all")]
     ]
     return InlineKeyboardMarkup(keyboard)
 
+def get_title_suggestions_keyboard(user_id: int, category: str):
+    """Кнопки частых названий в категории для шага ввода названия"""
+    keyboard = [
+        [InlineKeyboardButton(entry.title, callback_data=f"suggest_{entry.entry_id}")]
+        for entry in expense_bot.suggestions.suggest(user_id, category=category)
+    ]
+    keyboard.append([InlineKeyboardButton("❌ Отмена", callback_data="back")])
+    return InlineKeyboardMarkup(keyboard)
+
+def get_amount_keyboard(last_amount: float = None):
+    """Клавиатура шага ввода суммы (с прошлой суммой, если название уже встречалось)"""
+    keyboard = []
+    if last_amount:
+        keyboard.append([
+            InlineKeyboardButton(f"💸 Как в прошлый раз: {last_amount:.0f} ₽", callback_data="repeat_amount")
+        ])
+    keyboard.append([InlineKeyboardButton("❌ Отмена", callback_data="back")])
+    return InlineKeyboardMarkup(keyboard)
+
 def get_category_menu_keyboard():
     """Меню категории"""
     keyboard = [
         [InlineKeyboardButton("➕ Добавить трату", callback_data="add_expense")],
         [InlineKeyboardButton("❌ Удалить трату", callback_data="delete_expense")],
+        [InlineKeyboardButton("🎯 Бюджет на месяц", callback_data="set_budget")],
+        [InlineKeyboardButton("🔁 Регулярные траты", callback_data="recurring")],
         [InlineKeyboardButton("◀️ Назад", callback_data="back_to_main")]
     ]
     return InlineKeyboardMarkup(keyboard)
@@ -284,6 +1253,42 @@ def get_export_period_keyboard():
     ]
     return InlineKeyboardMarkup(keyboard)
 
+def get_search_keyboard(search: Dict[str, Any], page: int, pages: int):
+    """Навигация и фильтры результатов поиска"""
+    keyboard = []
+    
+    navigation = []
+    if page > 0:
+        navigation.append(InlineKeyboardButton("◀️", callback_data=f"search_page_{page - 1}"))
+    if page < pages - 1:
+        navigation.append(InlineKeyboardButton("▶️", callback_data=f"search_page_{page + 1}"))
+    if navigation:
+        keyboard.append(navigation)
+    
+    periods = [('day', "День"), ('week', "Неделя"), ('month', "Месяц"), ('all', "Всё время")]
+    keyboard.append([
+        InlineKeyboardButton(
+            f"✅ {name}" if search['period'] == period else name,
+            callback_data=f"search_period_{period}"
+        )
+        for period, name in periods
+    ])
+    keyboard.append([
+        InlineKeyboardButton("📂 Категория", callback_data="search_categories"),
+        InlineKeyboardButton("🏠 В меню", callback_data="back_to_main")
+    ])
+    return InlineKeyboardMarkup(keyboard)
+
+def get_search_category_keyboard():
+    """Выбор категории для фильтра поиска"""
+    items = list(CATEGORIES.items())
+    keyboard = [
+        [InlineKeyboardButton(name, callback_data=f"search_cat_{key}") for key, name in items[i:i + 2]]
+        for i in range(0, len(items), 2)
+    ]
+    keyboard.append([InlineKeyboardButton("Все категории", callback_data="search_cat_all")])
+    return InlineKeyboardMarkup(keyboard)
+
 def get_confirmation_keyboard(action):
     """Клавиатура подтверждения"""
     keyboard = [
@@ -313,9 +1318,11 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     else:
         message = "👋 Привет! Это твой финансовый помощник.\n\n💰 Ты ещё ничего не потратил в этом месяце."
     
+    message += format_budgets_status(user_id)
+    
     await update.message.reply_text(
         message,
-        reply_markup=get_main_menu_keyboard()
+        reply_markup=get_main_menu_keyboard(user_id)
     )
 
 async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -339,54 +1346,130 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     # Добавление траты
     elif data == 'add_expense':
+        category = context.user_data.get('selected_category')
         await query.edit_message_text(
-            "На что потратил? Напиши название.",
+            "На что потратил? Напиши название или выбери из частых.",
+            reply_markup=get_title_suggestions_keyboard(user_id, category)
+        )
+        return ADD_EXPENSE_NAME
+    
+    # Бюджет категории
+    elif data == 'set_budget':
+        category = context.user_data.get('selected_category')
+        if not category:
+            await start_from_callback(query)
+            return
+        
+        status = expense_bot.get_budget_status(user_id, category)
+        if status:
+            limit, spent = status
+            current = f"Сейчас бюджет {limit:.0f} ₽, потрачено {spent:.0f} ₽."
+        else:
+            current = "Бюджет пока не задан."
+        
+        await query.edit_message_text(
+            f"🎯 Бюджет на месяц для «{CATEGORIES[category]}». {current}\n\n"
+            "Введи лимит в рублях (0 — убрать бюджет).",
             reply_markup=InlineKeyboardMarkup([
                 [InlineKeyboardButton("❌ Отмена", callback_data="back")]
             ])
         )
-        return ADD_EXPENSE_NAME
+        return SET_BUDGET_AMOUNT
     
-    # Удаление траты
-    elif data == 'delete_expense':
+    # Регулярные траты категории
+    elif data == 'recurring':
         category = context.user_data.get('selected_category')
         if not category:
-            await query.edit_message_text(
-                "Ошибка: категория не выбрана.",
-                reply_markup=get_main_menu_keyboard()
-            )
+            await start_from_callback(query)
             return
         
-        today_expenses = expense_bot.get_today_expenses(user_id, category)
+        message, reply_markup = build_recurring_list(user_id, category)
+        await query.edit_message_text(message, reply_markup=reply_markup)
+    
+    elif data == 'recurring_add':
+        await query.edit_message_text(
+            "Как называется регулярная трата? Например, «Netflix».",
+            reply_markup=InlineKeyboardMarkup([
+                [InlineKeyboardButton("❌ Отмена", callback_data="back")]
+            ])
+        )
+        return RECURRING_TITLE
+    
+    elif data.startswith('recurring_del_'):
+        # Категория в самой кнопке: после перезапуска user_data пуст
+        category, _, rule_id = data.replace('recurring_del_', '').rpartition('_')
+        expense_bot.delete_recurring(int(rule_id), user_id)
         
-        if not today_expenses:
+        if category not in CATEGORIES:
+            await start_from_callback(query)
+            return
+        
+        context.user_data['selected_category'] = category
+        message, reply_markup = build_recurring_list(user_id, category)
+        await query.edit_message_text(
+            "🗑️ Регулярная трата удалена.\n\n" + message, reply_markup=reply_markup
+        )
+    
+    # Быстрое добавление частой траты из главного меню
+    elif data.startswith('quick_'):
+        entry = expense_bot.suggestions.get_entry(user_id, data.replace('quick_', ''))
+        if not entry:
             await query.edit_message_text(
-                "У тебя нет трат за сегодня в этой категории.",
-                reply_markup=get_category_menu_keyboard()
+                "Эта подсказка устарела, выбери трату заново.",
+                reply_markup=get_main_menu_keyboard(user_id)
             )
-        else:
-            keyboard = []
-            for expense_id, title, amount in today_expenses:
-                keyboard.append([
-                    InlineKeyboardButton(
-                        f"{title} — {amount:.0f} ₽",
-                        callback_data=f"delete_expense_{expense_id}_{title}_{amount}"
-                    )
-                ])
-            keyboard.append([InlineKeyboardButton("◀️ Назад", callback_data="back")])
-            
+            return
+        
+        context.user_data['selected_category'] = entry.category
+        await query.edit_message_text(
+            record_expense(user_id, entry.category, entry.title, entry.last_amount),
+            reply_markup=get_back_to_menu_keyboard()
+        )
+    
+    # История трат (удаление отдельных трат)
+    elif data == 'delete_expense':
+        category = context.user_data.get('selected_category')
+        if not category:
             await query.edit_message_text(
-                "Выбери трату для удаления:",
-                reply_markup=InlineKeyboardMarkup(keyboard)
+                "Ошибка: категория не выбрана.",
+                reply_markup=get_main_menu_keyboard()
             )
+            return
+        
+        message, reply_markup = build_history_page(user_id, category)
+        await query.edit_message_text(message, reply_markup=reply_markup)
+    
+    elif data == 'history':
+        message, reply_markup = build_history_page(user_id, None)
+        await query.edit_message_text(message, reply_markup=reply_markup)
+    
+    elif data.startswith('hist_'):
+        # hist_o_<курсор> — старее курсора, hist_n_<курсор> — новее
+        direction, token = data[len('hist_'):].split('_', 1)
+        category, cursor = decode_history_cursor(token)
+        if category:
+            context.user_data['selected_category'] = category
+        message, reply_markup = build_history_page(
+            user_id,
+            category,
+            before=cursor if direction == 'o' else None,
+            after=cursor if direction == 'n' else None
+        )
+        await query.edit_message_text(message, reply_markup=reply_markup)
     
     # Подтверждение удаления конкретной траты
     elif data.startswith('delete_expense_'):
-        parts = data.split('_', 4)  # delete_expense_ID_title_amount
-        expense_id = int(parts[2])
-        title = parts[3]
-        amount = float(parts[4])
+        expense_id = int(data.split('_')[2])  # delete_expense_ID
+        expense = expense_bot.get_expense(expense_id, user_id)
+        
+        if not expense:
+            await query.edit_message_text(
+                "Трата не найдена — возможно, она уже удалена.",
+                reply_markup=get_back_to_menu_keyboard()
+            )
+            return
         
+        _, _, title, amount, _ = expense
         context.user_data['delete_expense_id'] = expense_id
         
         await query.edit_message_text(
@@ -445,6 +1528,40 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         period = data.replace('export_', '')
         await export_expenses(query, user_id, period)
     
+    # Поиск
+    elif data == 'search':
+        await query.edit_message_text(
+            "Что ищем? Напиши название траты или его начало (например, «нетф»).",
+            reply_markup=InlineKeyboardMarkup([
+                [InlineKeyboardButton("❌ Отмена", callback_data="back_to_main")]
+            ])
+        )
+        return SEARCH_QUERY
+    
+    elif data.startswith('search_'):
+        search = context.user_data.get('search')
+        if not search:
+            await start_from_callback(query)
+            return
+        
+        page = 0
+        if data == 'search_categories':
+            await query.edit_message_text(
+                "Выбери категорию для поиска:",
+                reply_markup=get_search_category_keyboard()
+            )
+            return
+        elif data.startswith('search_cat_'):
+            category = data.replace('search_cat_', '')
+            search['category'] = category if category in CATEGORIES else None
+        elif data.startswith('search_period_'):
+            search['period'] = data.replace('search_period_', '')
+        elif data.startswith('search_page_'):
+            page = int(data.replace('search_page_', ''))
+        
+        message, reply_markup = build_search_results(user_id, search, page)
+        await query.edit_message_text(message, reply_markup=reply_markup)
+    
     # Навигация
     elif data == 'back_to_main':
         await start_from_callback(query)
@@ -477,24 +1594,97 @@ async def start_from_callback(query):
     else:
         message = "👋 Привет! Это твой финансовый помощник.\n\n💰 Ты ещё ничего не потратил в этом месяце."
     
+    message += format_budgets_status(user_id)
+    
     await query.edit_message_text(
         message,
-        reply_markup=get_main_menu_keyboard()
+        reply_markup=get_main_menu_keyboard(user_id)
     )
 
+def record_expense(user_id: int, category: str, title: str, amount: float) -> str:
+    """Сохранить трату и вернуть текст подтверждения"""
+    expense_bot.add_expense(user_id, category, title, amount)
+    
+    category_name = CATEGORIES[category]
+    message = f"✅ Трата «{title}» на сумму {amount:.0f} ₽ добавлена в категорию «{category_name}»."
+    
+    # Проверка бюджета: одна выборка по ключу, без пересчёта трат за месяц
+    status = expense_bot.get_budget_status(user_id, category)
+    if status:
+        limit, spent = status
+        threshold = budget_threshold_crossed(limit, spent, amount)
+        if threshold == 100:
+            message += f"\n\n🚨 Бюджет превышен: {spent:.0f} из {limit:.0f} ₽ за месяц."
+        elif threshold:
+            message += f"\n\n⚠️ Потрачено {threshold}% бюджета: {spent:.0f} из {limit:.0f} ₽ за месяц."
+    
+    return message
+
 async def add_expense_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Получение названия траты"""
-    context.user_data['expense_name'] = update.message.text
+    title = update.message.text
+    context.user_data['expense_name'] = title
+    
+    entry = expense_bot.suggestions.find(
+        update.effective_user.id, context.user_data.get('selected_category'), title
+    )
+    context.user_data['suggested_amount'] = entry.last_amount if entry else None
     
     await update.message.reply_text(
         "Сколько потратил? Введи число.",
-        reply_markup=InlineKeyboardMarkup([
-            [InlineKeyboardButton("❌ Отмена", callback_data="back")]
-        ])
+        reply_markup=get_amount_keyboard(context.user_data['suggested_amount'])
+    )
+    
+    return ADD_EXPENSE_AMOUNT
+
+async def add_expense_suggestion(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Выбор названия траты из подсказок"""
+    query = update.callback_query
+    await query.answer()
+    
+    entry = expense_bot.suggestions.get_entry(
+        update.effective_user.id, query.data.replace('suggest_', '')
+    )
+    if not entry:
+        await query.edit_message_text(
+            "Эта подсказка устарела. Напиши название траты.",
+            reply_markup=InlineKeyboardMarkup([
+                [InlineKeyboardButton("❌ Отмена", callback_data="back")]
+            ])
+        )
+        return ADD_EXPENSE_NAME
+    
+    context.user_data['expense_name'] = entry.title
+    context.user_data['suggested_amount'] = entry.last_amount
+    
+    await query.edit_message_text(
+        f"«{entry.title}». Сколько потратил? Введи число.",
+        reply_markup=get_amount_keyboard(entry.last_amount)
     )
     
     return ADD_EXPENSE_AMOUNT
 
+async def add_expense_repeat_amount(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Добавление траты с суммой, как в прошлый раз"""
+    query = update.callback_query
+    await query.answer()
+    
+    amount = context.user_data.get('suggested_amount')
+    if not amount:
+        return ADD_EXPENSE_AMOUNT
+    
+    await query.edit_message_text(
+        record_expense(
+            update.effective_user.id,
+            context.user_data['selected_category'],
+            context.user_data['expense_name'],
+            amount
+        ),
+        reply_markup=get_back_to_menu_keyboard()
+    )
+    
+    return ConversationHandler.END
+
 async def add_expense_amount(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Получение суммы траты"""
     try:
@@ -511,12 +1701,8 @@ async def add_expense_amount(update: Update, context: ContextTypes.DEFAULT_TYPE)
         category = context.user_data['selected_category']
         title = context.user_data['expense_name']
         
-        expense_bot.add_expense(user_id, category, title, amount)
-        
-        category_name = CATEGORIES[category]
-        
         await update.message.reply_text(
-            f"✅ Трата «{title}» на сумму {amount:.0f} ₽ добавлена в категорию «{category_name}».",
+            record_expense(user_id, category, title, amount),
             reply_markup=get_back_to_menu_keyboard()
         )
         
@@ -528,30 +1714,395 @@ async def add_expense_amount(update: Update, context: ContextTypes.DEFAULT_TYPE)
         )
         return ADD_EXPENSE_AMOUNT
 
+def build_history_page(user_id: int, category: str = None, before: tuple = None, after: tuple = None):
+    """Текст и клавиатура для страницы истории трат (по дням, от новых к старым)"""
+    page = expense_bot.get_expenses_page(user_id, category, before=before, after=after)
+    
+    title = CATEGORIES[category] if category else "все категории"
+    back_button = InlineKeyboardButton("◀️ Назад", callback_data="back" if category else "back_to_main")
+    
+    if not page['rows']:
+        return (
+            f"🗂 История: {title}\n\nТрат пока нет.",
+            InlineKeyboardMarkup([[back_button]])
+        )
+    
+    message = f"🗂 История: {title}\nВыбери трату, чтобы удалить её.\n"
+    keyboard = []
+    current_day = None
+    
+    for expense_id, expense_category, expense_title, amount, timestamp in page['rows']:
+        moment = datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S')
+        if moment.date() != current_day:
+            current_day = moment.date()
+            message += f"\n📅 {moment.strftime('%d.%m.%Y')}\n"
+        message += f"  {moment.strftime('%H:%M')} {expense_title} — {amount:.0f} ₽\n"
+        
+        label = f"{moment.strftime('%d.%m')} · {expense_title} — {amount:.0f} ₽"
+        if not category:
+            label = f"{CATEGORIES.get(expense_category, expense_category).split(' ', 1)[0]} {label}"
+        keyboard.append([InlineKeyboardButton(label, callback_data=f"delete_expense_{expense_id}")])
+    
+    navigation = []
+    if page['has_newer']:
+        first = page['rows'][0]
+        navigation.append(InlineKeyboardButton(
+            "⬅️ Новее", callback_data=f"hist_n_{encode_history_cursor(category, first[4], first[0])}"
+        ))
+    if page['has_older']:
+        last = page['rows'][-1]
+        navigation.append(InlineKeyboardButton(
+            "Раньше ➡️", callback_data=f"hist_o_{encode_history_cursor(category, last[4], last[0])}"
+        ))
+    if navigation:
+        keyboard.append(navigation)
+    keyboard.append([back_button])
+    
+    return message, InlineKeyboardMarkup(keyboard)
+
+def build_search_results(user_id: int, search: Dict[str, Any], page: int):
+    """Текст и клавиатура для страницы результатов поиска"""
+    start_date, end_date, period_name = get_period_range(search['period'])
+    if search['period'] == 'all':
+        start_date = end_date = None
+    
+    result = expense_bot.search_expenses(
+        user_id, search['text'], search['category'], start_date, end_date,
+        limit=SEARCH_PAGE_SIZE, offset=page * SEARCH_PAGE_SIZE
+    )
+    pages = max(1, -(-result['count'] // SEARCH_PAGE_SIZE))
+    
+    category_name = CATEGORIES.get(search['category'], "все")
+    message = f"🔍 Поиск: «{search['text']}»\n"
+    message += f"📂 Категория: {category_name} | 🕒 Период: {period_name}\n\n"
+    
+    if result['count'] == 0:
+        message += "Ничего не найдено."
+    else:
+        message += f"Найдено: {result['count']} на сумму {result['total']:.0f} ₽\n\n"
+        for _, category, title, amount, timestamp in result['rows']:
+            date = datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S').strftime('%d.%m.%Y')
+            message += f"{date} — {title} — {amount:.0f} ₽ ({CATEGORIES.get(category, category)})\n"
+        if pages > 1:
+            message += f"\nСтраница {page + 1} из {pages}"
+    
+    return message, get_search_keyboard(search, page, pages)
+
+async def search_query(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Получение текста поискового запроса"""
+    context.user_data['search'] = {
+        'text': update.message.text,
+        'category': None,
+        'period': 'all'
+    }
+    
+    message, reply_markup = build_search_results(
+        update.effective_user.id, context.user_data['search'], 0
+    )
+    await update.message.reply_text(message, reply_markup=reply_markup)
+    
+    return ConversationHandler.END
+
+async def search_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик команды /search <запрос>"""
+    if not context.args:
+        await update.message.reply_text(
+            "Напиши, что искать: например, /search netflix"
+        )
+        return
+    
+    context.user_data['search'] = {
+        'text': ' '.join(context.args),
+        'category': None,
+        'period': 'all'
+    }
+    
+    message, reply_markup = build_search_results(
+        update.effective_user.id, context.user_data['search'], 0
+    )
+    await update.message.reply_text(message, reply_markup=reply_markup)
+
+def is_admin(update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
+    """Команды обслуживания доступны только администратору (ADMIN_ID)"""
+    admin_id = context.bot_data.get('admin_id')
+    return admin_id is not None and update.effective_user.id == admin_id
+
+async def backup_job(context: ContextTypes.DEFAULT_TYPE):
+    """Плановая резервная копия (в отдельном потоке, чтобы не блокировать обработку сообщений)"""
+    try:
+        await asyncio.to_thread(
+            expense_bot.backup_database,
+            context.bot_data['backup_dir'],
+            context.bot_data['backup_keep']
+        )
+    except Exception:
+        logger.exception("Ошибка при создании резервной копии")
+
+async def backup_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик команды /backup — создать резервную копию сейчас"""
+    if not is_admin(update, context):
+        await update.message.reply_text("Команда доступна только администратору.")
+        return
+    
+    try:
+        name = await asyncio.to_thread(
+            expense_bot.backup_database,
+            context.bot_data['backup_dir'],
+            context.bot_data['backup_keep']
+        )
+    except (ValueError, OSError, sqlite3.Error) as e:
+        logger.exception("Ошибка при создании резервной копии")
+        await update.message.reply_text(f"⚠️ Ошибка резервного копирования: {e}")
+        return
+    
+    await update.message.reply_text(f"💾 Резервная копия создана: {name}")
+
+async def restore_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик команды /restore [снимок] — без аргумента показывает список снимков"""
+    if not is_admin(update, context):
+        await update.message.reply_text("Команда доступна только администратору.")
+        return
+    
+    backup_dir = context.bot_data['backup_dir']
+    
+    if not context.args:
+        backups = expense_bot.list_backups(backup_dir)
+        if not backups:
+            await update.message.reply_text("Резервных копий пока нет.")
+        else:
+            await update.message.reply_text(
+                "💾 Доступные снимки (новые сверху):\n" + "\n".join(backups) +
+                "\n\nДля восстановления: /restore <имя снимка>"
+            )
+        return
+    
+    try:
+        await asyncio.to_thread(expense_bot.restore_database, backup_dir, context.args[0])
+    except (ValueError, OSError, sqlite3.Error) as e:
+        await update.message.reply_text(f"⚠️ Ошибка восстановления: {e}")
+        return
+    
+    # Очередь регулярных трат этого процесса перестроится по восстановленной базе сразу,
+    # остальных обработчиков — при ближайшей плановой перестройке
+    context.bot_data['recurring_scheduler'].loaded = False
+    
+    await update.message.reply_text(f"♻️ База восстановлена из снимка {context.args[0]}")
+
+async def set_budget_amount(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Получение лимита бюджета категории"""
+    try:
+        amount = float(update.message.text.replace(',', '.').replace(' ', ''))
+    except ValueError:
+        await update.message.reply_text(
+            "⚠️ Ошибка: введи число (например, 15000). Попробуй ещё раз."
+        )
+        return SET_BUDGET_AMOUNT
+    
+    if amount < 0:
+        await update.message.reply_text(
+            "⚠️ Ошибка: бюджет не может быть отрицательным. Попробуй ещё раз."
+        )
+        return SET_BUDGET_AMOUNT
+    
+    category = context.user_data['selected_category']
+    expense_bot.set_budget(update.effective_user.id, category, amount)
+    
+    if amount > 0:
+        message = f"🎯 Бюджет «{CATEGORIES[category]}» на месяц: {amount:.0f} ₽."
+    else:
+        message = f"Бюджет «{CATEGORIES[category]}» убран."
+    
+    await update.message.reply_text(message, reply_markup=get_back_to_menu_keyboard())
+    
+    return ConversationHandler.END
+
+def build_recurring_list(user_id: int, category: str):
+    """Текст и клавиатура со списком регулярных трат категории"""
+    rules = expense_bot.get_recurring_rules(user_id, category)
+    
+    message = f"🔁 Регулярные траты в «{CATEGORIES[category]}»"
+    keyboard = []
+    
+    if not rules:
+        message += "\n\nПока нет. Добавь подписку — она будет записываться сама."
+    else:
+        message += ":\n"
+        for rule_id, title, amount, schedule, next_due in rules:
+            next_date = datetime.strptime(next_due, '%Y-%m-%d %H:%M:%S').strftime('%d.%m.%Y')
+            message += (
+                f"\n• {title} — {amount:.0f} ₽, {RECURRING_SCHEDULES.get(schedule, schedule)}, "
+                f"следующее списание {next_date}"
+            )
+            keyboard.append([
+                InlineKeyboardButton(f"🗑 {title} — {amount:.0f} ₽", callback_data=f"recurring_del_{category}_{rule_id}")
+            ])
+    
+    keyboard.append([InlineKeyboardButton("➕ Добавить", callback_data="recurring_add")])
+    keyboard.append([InlineKeyboardButton("◀️ Назад", callback_data="back")])
+    return message, InlineKeyboardMarkup(keyboard)
+
+async def recurring_title(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Получение названия регулярной траты"""
+    context.user_data['recurring_title'] = update.message.text
+    
+    await update.message.reply_text(
+        "Сколько списывается каждый раз? Введи число.",
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("❌ Отмена", callback_data="back")]
+        ])
+    )
+    
+    return RECURRING_AMOUNT
+
+async def recurring_amount(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Получение суммы регулярной траты"""
+    try:
+        amount = float(update.message.text.replace(',', '.'))
+    except ValueError:
+        await update.message.reply_text(
+            "⚠️ Ошибка: введи число (например, 599). Попробуй ещё раз."
+        )
+        return RECURRING_AMOUNT
+    
+    if amount <= 0:
+        await update.message.reply_text(
+            "⚠️ Ошибка: сумма должна быть больше нуля. Попробуй ещё раз."
+        )
+        return RECURRING_AMOUNT
+    
+    context.user_data['recurring_amount'] = amount
+    
+    await update.message.reply_text(
+        "Как часто списывается?",
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton(name.capitalize(), callback_data=f"recurring_sched_{key}")]
+            for key, name in RECURRING_SCHEDULES.items()
+        ] + [[InlineKeyboardButton("❌ Отмена", callback_data="back")]])
+    )
+    
+    return RECURRING_SCHEDULE
+
+async def recurring_schedule(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Выбор периодичности регулярной траты"""
+    query = update.callback_query
+    await query.answer()
+    
+    context.user_data['recurring_schedule'] = query.data.replace('recurring_sched_', '')
+    
+    await query.edit_message_text(
+        "Когда ближайшее списание? Введи дату в формате ДД.ММ или ДД.ММ.ГГГГ.\n"
+        "Если дата уже прошла (не больше чем на один период), трата за неё тоже будет добавлена.",
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("Сегодня", callback_data="recurring_date_today")],
+            [InlineKeyboardButton("❌ Отмена", callback_data="back")]
+        ])
+    )
+    
+    return RECURRING_DATE
+
+async def recurring_date(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Получение даты первого списания и сохранение правила"""
+    query = update.callback_query
+    
+    if query:
+        await query.answer()
+        first_date = datetime.now().date()
+    else:
+        text = update.message.text.strip()
+        try:
+            if text.count('.') == 1:
+                text = f"{text}.{datetime.now().year}"
+            first_date = datetime.strptime(text, '%d.%m.%Y').date()
+        except ValueError:
+            await update.message.reply_text(
+                "⚠️ Ошибка: введи дату в формате ДД.ММ или ДД.ММ.ГГГГ (например, 05.11). Попробуй ещё раз."
+            )
+            return RECURRING_DATE
+    
+    first_due = datetime.strptime(
+        f"{first_date.strftime('%Y-%m-%d')} {RECURRING_TIME}", '%Y-%m-%d %H:%M:%S'
+    )
+    schedule = context.user_data['recurring_schedule']
+    
+    # Не больше одного периода в прошлом: иначе опечатка в годе задним числом
+    # запишет сотни трат в прошлые месяцы и бюджеты
+    if next_recurring_due(first_due, schedule, first_date.day).date() < datetime.now().date():
+        period = 'неделю' if schedule == 'weekly' else 'месяц'
+        await update.message.reply_text(
+            f"⚠️ Дата слишком давняя: первое списание можно указать не раньше чем на {period} назад. "
+            "Попробуй ещё раз."
+        )
+        return RECURRING_DATE
+    
+    user_id = update.effective_user.id
+    category = context.user_data['selected_category']
+    title = context.user_data['recurring_title']
+    amount = context.user_data['recurring_amount']
+    
+    rule_id, next_due = expense_bot.add_recurring(user_id, category, title, amount, schedule, first_due)
+    context.bot_data['recurring_scheduler'].schedule(rule_id, next_due)
+    
+    message = (
+        f"🔁 Регулярная трата «{title}» на {amount:.0f} ₽ ({RECURRING_SCHEDULES[schedule]}) добавлена. "
+        f"Ближайшее списание: {first_due.strftime('%d.%m.%Y')}."
+    )
+    if query:
+        await query.edit_message_text(message, reply_markup=get_back_to_menu_keyboard())
+    else:
+        await update.message.reply_text(message, reply_markup=get_back_to_menu_keyboard())
+    
+    return ConversationHandler.END
+
+async def recurring_job(context: ContextTypes.DEFAULT_TYPE):
+    """Шаг планировщика: записать наступившие регулярные траты и уведомить пользователей"""
+    created = await context.bot_data['recurring_scheduler'].tick(datetime.now())
+    if not created:
+        return
+    
+    # Одно сообщение на пользователя, сколько бы трат ни добавилось
+    by_user = {}
+    for user_id, category, title, amount, timestamp in created:
+        by_user.setdefault(user_id, []).append((title, amount, timestamp))
+    
+    logger.info(f"Регулярные траты: добавлено {len(created)} для {len(by_user)} пользователей")
+    
+    for user_id, items in by_user.items():
+        message = format_recurring_summary(items)
+        
+        # При RetryAfter ждём, сколько просит Telegram, и повторяем, пока не отправится
+        while True:
+            try:
+                await context.bot.send_message(user_id, message)
+                break
+            except RetryAfter as e:
+                await asyncio.sleep(e.retry_after)
+            except Forbidden:
+                logger.info(f"Пользователь {user_id} остановил бота, уведомление не отправлено")
+                break
+            except TelegramError:
+                logger.exception(f"Не удалось уведомить пользователя {user_id}")
+                break
+        
+        # Не превышаем лимит Telegram на рассылку
+        await asyncio.sleep(1 / RECURRING_NOTIFY_RATE)
+
+async def start_dialog(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Начало диалога; если он не начался (например, не выбрана категория), прежний тоже завершается"""
+    state = await button_handler(update, context)
+    return ConversationHandler.END if state is None else state
+
 async def cancel_conversation(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Отмена разговора"""
+    """Отмена разговора: показать меню (категории или главное) и завершить разговор"""
+    if update.callback_query:
+        await button_handler(update, context)
+    else:
+        await start(update, context)
+    
     return ConversationHandler.END
 
 async def generate_report(query, user_id: int, period: str):
     """Генерация отчёта"""
-    now = datetime.now()
-    
-    if period == 'day':
-        start_date = datetime(now.year, now.month, now.day)
-        end_date = now
-        period_name = "день"
-    elif period == 'week':
-        start_date = now - timedelta(days=7)
-        end_date = now
-        period_name = "неделю"
-    elif period == 'month':
-        start_date = datetime(now.year, now.month, 1)
-        end_date = now
-        period_name = "месяц"
-    else:  # all
-        start_date = datetime(2020, 1, 1)
-        end_date = now
-        period_name = "всё время"
+    start_date, end_date, period_name = get_period_range(period)
     
     report = expense_bot.get_expenses_report(user_id, start_date, end_date)
     
@@ -584,23 +2135,7 @@ async def generate_report(query, user_id: int, period: str):
 async def export_expenses(query, user_id: int, period: str):
     """Экспорт трат в Excel"""
     now = datetime.now()
-    
-    if period == 'day':
-        start_date = datetime(now.year, now.month, now.day)
-        end_date = now
-        period_name = "день"
-    elif period == 'week':
-        start_date = now - timedelta(days=7)
-        end_date = now
-        period_name = "неделю"
-    elif period == 'month':
-        start_date = datetime(now.year, now.month, 1)
-        end_date = now
-        period_name = "месяц"
-    else:  # all
-        start_date = datetime(2020, 1, 1)
-        end_date = now
-        period_name = "всё время"
+    start_date, end_date, period_name = get_period_range(period)
     
     # Проверяем, есть ли данные
     report = expense_bot.get_expenses_report(user_id, start_date, end_date)
@@ -629,37 +2164,200 @@ async def export_expenses(query, user_id: int, period: str):
         ])
     )
 
+def configure_application(application: Application, settings: Dict[str, Any]):
+    """Настройки и обработчики бота (одиночный режим и процессы-обработчики)"""
+    application.bot_data.update(settings)
+    application.bot_data['recurring_scheduler'] = RecurringScheduler(
+        expense_bot, shard=settings.get('worker_index', 0), shards=settings.get('workers', 1)
+    )
+    
+    # Все диалоги (трата, поиск, бюджет, регулярная трата) в одном ConversationHandler:
+    # вход в любой из них, в том числе кнопкой из старого сообщения, завершает начатый
+    dialog_handler = ConversationHandler(
+        entry_points=[
+            CallbackQueryHandler(start_dialog, pattern='^(add_expense|search|set_budget|recurring_add)$')
+        ],
+        states={
+            ADD_EXPENSE_NAME: [
+                MessageHandler(filters.TEXT & ~filters.COMMAND, add_expense_name),
+                CallbackQueryHandler(add_expense_suggestion, pattern='^suggest_')
+            ],
+            ADD_EXPENSE_AMOUNT: [
+                MessageHandler(filters.TEXT & ~filters.COMMAND, add_expense_amount),
+                CallbackQueryHandler(add_expense_repeat_amount, pattern='^repeat_amount$')
+            ],
+            SEARCH_QUERY: [MessageHandler(filters.TEXT & ~filters.COMMAND, search_query)],
+            SET_BUDGET_AMOUNT: [MessageHandler(filters.TEXT & ~filters.COMMAND, set_budget_amount)],
+            RECURRING_TITLE: [MessageHandler(filters.TEXT & ~filters.COMMAND, recurring_title)],
+            RECURRING_AMOUNT: [MessageHandler(filters.TEXT & ~filters.COMMAND, recurring_amount)],
+            RECURRING_SCHEDULE: [CallbackQueryHandler(recurring_schedule, pattern='^recurring_sched_')],
+            RECURRING_DATE: [
+                MessageHandler(filters.TEXT & ~filters.COMMAND, recurring_date),
+                CallbackQueryHandler(recurring_date, pattern='^recurring_date_today$')
+            ],
+        },
+        fallbacks=[
+            CallbackQueryHandler(cancel_conversation, pattern='^(back|back_to_main)$'),
+            CommandHandler('start', cancel_conversation)
+        ],
+        allow_reentry=True,
+        conversation_timeout=CONVERSATION_TIMEOUT
+    )
+    
+    # Добавляем обработчики
+    application.add_handler(CommandHandler('start', start))
+    application.add_handler(CommandHandler('search', search_command))
+    application.add_handler(CommandHandler('backup', backup_command))
+    application.add_handler(CommandHandler('restore', restore_command))
+    application.add_handler(dialog_handler)
+    application.add_handler(CallbackQueryHandler(button_handler))
+    
+    # Планировщик регулярных трат: одна задача на процесс, а не на каждое правило
+    application.job_queue.run_repeating(recurring_job, interval=RECURRING_TICK_SECONDS, first=5)
+
+def run_worker(index: int, token: str, settings: Dict[str, Any], update_queue):
+    """Процесс-обработчик: выполняет обновления своих пользователей из очереди по порядку"""
+    # Останавливается по сигналу из основного процесса, дообработав очередь, или сам,
+    # если основной процесс завершился
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    
+    asyncio.run(run_worker_loop(index, token, settings, update_queue))
+
+async def run_worker_loop(index: int, token: str, settings: Dict[str, Any], update_queue):
+    application = Application.builder().token(token).updater(None).build()
+    configure_application(application, dict(settings, worker_index=index))
+    loop = asyncio.get_running_loop()
+    
+    async with application:
+        await application.start()
+        logger.info(f"Обработчик {index} запущен")
+        
+        while True:
+            data = await loop.run_in_executor(None, next_worker_update, update_queue)
+            if data is None:
+                break
+            await application.update_queue.put(Update.de_json(data, application.bot))
+        
+        # stop() дожидается обработки всех уже полученных обновлений
+        await application.stop()
+    
+    logger.info(f"Обработчик {index} остановлен")
+
+def next_worker_update(update_queue) -> Optional[Dict[str, Any]]:
+    """Следующее обновление для обработчика; None — пора останавливаться"""
+    parent = multiprocessing.parent_process()
+    while True:
+        try:
+            return update_queue.get(timeout=WORKER_CHECK_INTERVAL)
+        except queue.Empty:
+            # Основной процесс убит (например, SIGKILL) и сигнала остановки уже не пришлёт
+            if parent is not None and not parent.is_alive():
+                logger.warning("Основной процесс завершился, останавливаем обработчик")
+                return None
+
+def worker_for_user(user_id: int, workers: int) -> int:
+    """Номер процесса-обработчика пользователя. Единственное место, где задаётся это соответствие:
+    по нему маршрутизируются обновления и делятся правила регулярных трат"""
+    return user_id % workers
+
+def start_worker(index: int, token: str, settings: Dict[str, Any], update_queue):
+    process = MP_CONTEXT.Process(
+        target=run_worker,
+        args=(index, token, settings, update_queue),
+        name=f"worker-{index}"
+    )
+    process.start()
+    return process
+
+async def route_update(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Передать обновление процессу пользователя: один пользователь — всегда один процесс"""
+    queues = context.bot_data['worker_queues']
+    user = update.effective_user
+    index = worker_for_user(user.id, len(queues)) if user else 0
+    queues[index].put(update.to_dict())
+
+async def supervise_workers(context: ContextTypes.DEFAULT_TYPE):
+    """Перезапуск упавших обработчиков с прежней очередью.
+    
+    Обновления, ещё ждущие в очереди, достанутся новому процессу; то, которое обрабатывалось
+    в момент падения, теряется.
+    """
+    processes = context.bot_data['worker_processes']
+    queues = context.bot_data['worker_queues']
+    
+    for index, process in enumerate(processes):
+        if not process.is_alive():
+            logger.warning(f"Обработчик {index} завершился (код {process.exitcode}), перезапускаем")
+            processes[index] = start_worker(
+                index, context.bot.token, context.bot_data['worker_settings'], queues[index]
+            )
+
+def stop_workers(processes: list, queues: list):
+    """Плавная остановка: обработчики дорабатывают очередь, затем завершаются"""
+    for update_queue in queues:
+        update_queue.put(None)
+    
+    deadline = time.monotonic() + WORKER_DRAIN_TIMEOUT
+    for index, process in enumerate(processes):
+        process.join(max(0, deadline - time.monotonic()))
+        if process.is_alive():
+            logger.warning(f"Обработчик {index} не успел завершиться, останавливаем принудительно")
+            process.terminate()
+            process.join()
+
 def main():
     # Получаем переменные окружения
     token = os.getenv('BOT_TOKEN')
     port = int(os.getenv('PORT', 8000))
     app_name = os.getenv('RENDER_SERVICE_NAME', 'financebot')
+    admin_id = os.getenv('ADMIN_ID')
+    backup_dir = os.getenv('BACKUP_DIR', 'backups')
+    backup_interval_hours = float(os.getenv('BACKUP_INTERVAL_HOURS', 24))
+    backup_keep = int(os.getenv('BACKUP_KEEP', 7))
+    workers = int(os.getenv('WORKERS', 1))
     
     if not token:
         logger.error("BOT_TOKEN не установлен в переменных окружения")
         return
     
+    if backup_keep < 1:
+        logger.error("BACKUP_KEEP должен быть не меньше 1")
+        return
+    
+    settings = {
+        'admin_id': int(admin_id) if admin_id else None,
+        'backup_dir': backup_dir,
+        'backup_keep': backup_keep,
+        'workers': max(workers, 1)
+    }
+    
     # Создаём приложение
     application = Application.builder().token(token).build()
+    application.bot_data.update(settings)
     
-    # Создаём ConversationHandler для добавления трат
-    add_expense_handler = ConversationHandler(
-        entry_points=[CallbackQueryHandler(button_handler, pattern='^add_expense$')],
-        states={
-            ADD_EXPENSE_NAME: [MessageHandler(filters.TEXT & ~filters.COMMAND, add_expense_name)],
-            ADD_EXPENSE_AMOUNT: [MessageHandler(filters.TEXT & ~filters.COMMAND, add_expense_amount)],
-        },
-        fallbacks=[
-            CallbackQueryHandler(button_handler, pattern='^back$'),
-            CallbackQueryHandler(button_handler, pattern='^back_to_main$'),
-            CommandHandler('start', start)
-        ]
-    )
+    if workers > 1:
+        # Основной процесс только принимает вебхук и раздаёт обновления по user_id
+        queues = [MP_CONTEXT.Queue() for _ in range(workers)]
+        processes = [start_worker(index, token, settings, queues[index]) for index in range(workers)]
+        
+        application.bot_data['worker_settings'] = settings
+        application.bot_data['worker_queues'] = queues
+        application.bot_data['worker_processes'] = processes
+        application.add_handler(TypeHandler(Update, route_update))
+        application.job_queue.run_repeating(supervise_workers, interval=WORKER_CHECK_INTERVAL)
+        
+        logger.info(f"Режим нескольких процессов: {workers} обработчиков")
+    else:
+        configure_application(application, settings)
     
-    # Добавляем обработчики
-    application.add_handler(CommandHandler('start', start))
-    application.add_handler(add_expense_handler)
-    application.add_handler(CallbackQueryHandler(button_handler))
+    # Плановые резервные копии
+    if backup_interval_hours > 0:
+        application.job_queue.run_repeating(
+            backup_job,
+            interval=backup_interval_hours * 3600,
+            first=60
+        )
     
     # Настраиваем вебхук для Render.com
     webhook_url = f"https://{app_name}.onrender.com/{token}"
@@ -667,14 +2365,18 @@ def main():
     logger.info(f"Запуск бота на порту {port}")
     logger.info(f"Webhook URL: {webhook_url}")
     
-    # Запускаем бота с вебхуком
-    application.run_webhook(
-        listen="0.0.0.0",
-        port=port,
-        webhook_url=webhook_url,
-        url_path=token,
-        secret_token=None
-    )
+    # Запускаем бота с вебхуком; обработчики останавливаем, даже если запуск не удался
+    try:
+        application.run_webhook(
+            listen="0.0.0.0",
+            port=port,
+            webhook_url=webhook_url,
+            url_path=token,
+            secret_token=None
+        )
+    finally:
+        if workers > 1:
+            stop_workers(application.bot_data['worker_processes'], application.bot_data['worker_queues'])
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -6,12 +6,80 @@
 
 import os
 import sys
-from datetime import datetime
+import json
+import asyncio
+import tempfile
+from datetime import datetime, timedelta
 
 # Добавляем текущую директорию в путь
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from bot import ExpenseBot, CATEGORIES
+from telegram import Update
+from telegram.ext import Application
+from telegram.request import BaseRequest
+
+from bot import (
+    ExpenseBot, CATEGORIES, RecurringScheduler, encode_history_cursor, decode_history_cursor,
+    budget_threshold_crossed, next_recurring_due, configure_application, RECURRING_RELOAD_SECONDS,
+    worker_for_user, route_update, format_recurring_summary,
+    TitleSuggestions, SUGGEST_PREFIX_DEPTH, SUGGEST_MAX_NODES
+)
+
+class FakeRequest(BaseRequest):
+    """Подмена Bot API: запоминает тексты ответов бота вместо отправки в Telegram"""
+    
+    def __init__(self):
+        self.sent = []
+    
+    async def initialize(self):
+        pass
+    
+    async def shutdown(self):
+        pass
+    
+    async def do_request(self, url, method, request_data=None, **kwargs):
+        endpoint = url.rsplit('/', 1)[-1]
+        params = request_data.parameters if request_data else {}
+        
+        if endpoint == 'getMe':
+            result = {'id': 1, 'is_bot': True, 'first_name': 'bot', 'username': 'test_bot'}
+        elif endpoint in ('sendMessage', 'editMessageText'):
+            self.sent.append(params.get('text'))
+            result = {
+                'message_id': 1, 'date': 0, 'text': params.get('text'),
+                'chat': {'id': params.get('chat_id', 1), 'type': 'private'}
+            }
+        else:
+            result = True
+        
+        return 200, json.dumps({'ok': True, 'result': result}).encode()
+
+async def run_dialog(user_id: int, steps: list) -> list:
+    """Прогнать через обработчики бота последовательность нажатий ('cb', data) и сообщений ('text', текст)"""
+    request = FakeRequest()
+    application = (
+        Application.builder().token('123:abc').request(request)
+        .get_updates_request(FakeRequest()).updater(None).build()
+    )
+    configure_application(application, {'admin_id': None, 'backup_dir': 'backups', 'backup_keep': 1})
+    
+    user = {'id': user_id, 'is_bot': False, 'first_name': 'Тест'}
+    chat = {'id': user_id, 'type': 'private'}
+    
+    async with application:
+        for number, (kind, value) in enumerate(steps, start=1):
+            message = {'message_id': number, 'date': 0, 'chat': chat, 'from': user}
+            if kind == 'cb':
+                data = {'update_id': number, 'callback_query': {
+                    'id': str(number), 'from': user, 'chat_instance': 'test',
+                    'data': value, 'message': dict(message, text='меню')
+                }}
+            else:
+                data = {'update_id': number, 'message': dict(message, text=value)}
+            await application.process_update(Update.de_json(data, application.bot))
+    
+    return request.sent
+
 
 def test_expense_bot():
     """Тестирование основных функций бота"""
@@ -108,6 +176,360 @@ def test_expense_bot():
     print("   ✅ Удаление всех трат")
     print("\n🚀 Бот готов к развёртыванию!")
 
+def test_search():
+    """Тест полнотекстового поиска по названиям трат"""
+    print("\n🔍 Проверка поиска:")
+    bot = ExpenseBot()
+    test_user_id = 23456
+    other_user_id = 34567
+    
+    bot.add_expense(test_user_id, 'subscriptions', 'Netflix', 599.0)
+    bot.add_expense(test_user_id, 'subscriptions', 'Netflix семейный', 999.0)
+    bot.add_expense(test_user_id, 'food_out', 'Кофе с собой', 250.0)
+    bot.add_expense(other_user_id, 'subscriptions', 'Netflix', 599.0)
+    
+    result = bot.search_expenses(test_user_id, 'netf')
+    print(f"   По запросу «netf» найдено: {result['count']} на сумму {result['total']} ₽")
+    assert result['count'] == 2, "Ошибка: должно найтись 2 траты (только свои)"
+    assert result['total'] == 1598.0, "Ошибка: сумма найденных трат не совпадает"
+    
+    result = bot.search_expenses(test_user_id, 'КОФ', category='food_out')
+    assert result['count'] == 1, "Ошибка: поиск должен учитывать категорию и быть нечувствителен к регистру"
+    
+    result = bot.search_expenses(test_user_id, 'netflix', limit=1, offset=1)
+    assert len(result['rows']) == 1 and result['count'] == 2, "Ошибка: пагинация результатов"
+    
+    expense_id = result['rows'][0][0]
+    bot.delete_expense(expense_id, test_user_id)
+    result = bot.search_expenses(test_user_id, 'netflix')
+    assert result['count'] == 1, "Ошибка: индекс должен обновляться при удалении"
+    
+    bot.delete_all_expenses(test_user_id)
+    bot.delete_all_expenses(other_user_id)
+    assert bot.search_expenses(test_user_id, 'netflix')['count'] == 0, "Ошибка: индекс не очищен"
+    print("   ✅ Поиск работает")
+
+def test_suggestions():
+    """Тест индекса подсказок названий"""
+    print("\n💡 Проверка подсказок:")
+    bot = ExpenseBot()
+    test_user_id = 45678
+    
+    bot.add_expense(test_user_id, 'transport', 'Метро', 60.0)
+    bot.add_expense(test_user_id, 'food_out', 'Кофе', 200.0)
+    
+    # Индекс строится из базы при первом обращении
+    suggestions = bot.suggestions.suggest(test_user_id)
+    assert [entry.title for entry in suggestions] == ['Кофе', 'Метро'], "Ошибка: порядок подсказок"
+    
+    # И дальше обновляется при добавлении трат
+    bot.add_expense(test_user_id, 'transport', 'метро', 65.0)
+    bot.add_expense(test_user_id, 'transport', 'Маршрутка', 50.0)
+    top = bot.suggestions.suggest(test_user_id, 'м', category='transport')
+    print(f"   Подсказки на «м»: {[(entry.title, entry.count) for entry in top]}")
+    assert top[0].title == 'Метро' and top[0].count == 2, "Ошибка: частое название должно быть первым"
+    assert top[0].last_amount == 65.0, "Ошибка: должна запоминаться последняя сумма"
+    assert bot.suggestions.suggest(test_user_id, 'мет', category='food_out') == [], "Ошибка: фильтр по категории"
+    assert bot.suggestions.find(test_user_id, 'food_out', ' кофе ') is not None, "Ошибка: поиск названия"
+    
+    # Ключи кнопок не меняются после перестройки индекса (удаление, вытеснение, перезапуск)
+    bot.add_expense(test_user_id, 'transport', 'Такси', 400.0)
+    ids = {entry.title: entry.entry_id for entry in bot.suggestions.suggest(test_user_id)}
+    taxi_id = bot.get_expenses_page(test_user_id, 'transport', limit=1)['rows'][0][0]
+    bot.delete_expense(taxi_id, test_user_id)
+    assert bot.suggestions.get_entry(test_user_id, ids['Такси']) is None, "Ошибка: удалённое название нашлось"
+    for title in ('Кофе', 'Метро'):
+        entry = bot.suggestions.get_entry(test_user_id, ids[title])
+        assert entry is not None and entry.title == title, f"Ошибка: ключ «{title}» указывает на другое название"
+    
+    # Длинные названия не углубляют дерево, но находятся и по длинному префиксу
+    long_title = 'Абонемент в бассейн на полгода'
+    bot.add_expense(test_user_id, 'home', long_title, 9000.0)
+    top = bot.suggestions.suggest(test_user_id, long_title[:20])
+    assert [entry.title for entry in top] == [long_title], "Ошибка: поиск по префиксу длиннее дерева"
+    assert bot.suggestions.suggest(test_user_id, long_title[:15] + 'я') == [], "Ошибка: лишнее совпадение"
+    
+    # Память кэша ограничена числом узлов, а не только числом пользователей
+    def many_titles(user_id: int) -> list:
+        return [('other', f"{number:04d}-{user_id:02d} трата пользователя", 1.0) for number in range(1000)]
+    
+    cache = TitleSuggestions(many_titles)
+    for user_id in range(20):
+        cache.suggest(user_id)
+    assert cache.nodes == sum(index.nodes for index in cache.users.values()), "Ошибка: учёт узлов"
+    assert cache.nodes <= SUGGEST_MAX_NODES, f"Ошибка: в кэше {cache.nodes} узлов"
+    assert 1 < len(cache.users) < 20 and 19 in cache.users, "Ошибка: вытеснение по памяти"
+    assert max(index.nodes for index in cache.users.values()) <= 1000 * 2 * SUGGEST_PREFIX_DEPTH + 2
+    
+    bot.delete_all_expenses(test_user_id)
+    assert bot.suggestions.suggest(test_user_id) == [], "Ошибка: подсказки должны сбрасываться"
+    print("   ✅ Подсказки работают")
+
+def test_backup_restore():
+    """Тест резервного копирования и восстановления"""
+    print("\n💾 Проверка резервных копий:")
+    bot = ExpenseBot()
+    test_user_id = 56789
+    
+    with tempfile.TemporaryDirectory() as backup_dir:
+        bot.add_expense(test_user_id, 'home', 'Лампочка', 150.0)
+        first = bot.backup_database(backup_dir, keep=2)
+        name = bot.backup_database(backup_dir, keep=1)
+        print(f"   Создан снимок: {name}")
+        assert first != name, "Ошибка: две копии подряд получили одно имя"
+        assert bot.list_backups(backup_dir) == [name], "Ошибка: снимок не найден или старый не удалён"
+        
+        try:
+            bot.backup_database(backup_dir, keep=0)
+            assert False, "Ошибка: keep=0 должен быть запрещён"
+        except ValueError:
+            pass
+        assert bot.list_backups(backup_dir) == [name], "Ошибка: keep=0 удалил снимки"
+        
+        bot.delete_all_expenses(test_user_id)
+        assert bot.get_monthly_total(test_user_id) == 0.0
+        
+        bot.restore_database(backup_dir, name)
+        assert bot.get_monthly_total(test_user_id) == 150.0, "Ошибка: трата не восстановилась"
+        assert bot.search_expenses(test_user_id, 'лампоч')['count'] == 1, "Ошибка: поиск после восстановления"
+        
+        # Повреждённый снимок не должен восстанавливаться
+        with open(os.path.join(backup_dir, name + '.sha256'), 'w') as f:
+            f.write('0' * 64 + '  ' + name + '\n')
+        try:
+            bot.restore_database(backup_dir, name)
+            assert False, "Ошибка: снимок с неверной контрольной суммой восстановлен"
+        except ValueError:
+            pass
+    
+    bot.delete_all_expenses(test_user_id)
+    print("   ✅ Резервные копии работают")
+
+def test_history_pages():
+    """Тест курсорной пагинации истории трат"""
+    print("\n🗂 Проверка истории:")
+    bot = ExpenseBot()
+    test_user_id = 67890
+    
+    # Траты добавляются в одну секунду — порядок внутри секунды держится на id
+    for i in range(7):
+        bot.add_expense(test_user_id, 'transport', f'Поездка {i}', 10.0 + i)
+    bot.add_expense(test_user_id, 'food_out', 'Обед', 300.0)
+    
+    seen = []
+    page = bot.get_expenses_page(test_user_id, 'transport', limit=3)
+    assert not page['has_newer'], "Ошибка: у первой страницы нет более новых трат"
+    pages = [page]
+    while page['has_older']:
+        last = page['rows'][-1]
+        category, cursor = decode_history_cursor(encode_history_cursor('transport', last[4], last[0]))
+        assert category == 'transport', "Ошибка: категория не сохранилась в курсоре"
+        page = bot.get_expenses_page(test_user_id, 'transport', before=cursor, limit=3)
+        pages.append(page)
+    
+    for page in pages:
+        seen.extend(title for _, _, title, _, _ in page['rows'])
+    print(f"   Страниц: {len(pages)}, трат: {len(seen)}")
+    assert seen == [f'Поездка {i}' for i in reversed(range(7))], "Ошибка: порядок или пропуски в истории"
+    
+    # Листаем обратно к более новым
+    first = pages[-1]['rows'][0]
+    newer = bot.get_expenses_page(test_user_id, 'transport', after=(first[4], first[0]), limit=3)
+    assert newer['rows'] == pages[-2]['rows'], "Ошибка: страница «новее» не совпадает"
+    
+    assert decode_history_cursor(encode_history_cursor(None, first[4], first[0]))[0] is None
+    
+    # Кнопка со старой страницы работает и в новом процессе с пустым user_data
+    token = encode_history_cursor('transport', pages[0]['rows'][-1][4], pages[0]['rows'][-1][0])
+    sent = asyncio.run(run_dialog(test_user_id, [('cb', f'hist_o_{token}')]))
+    assert sent[-1].startswith(f"🗂 История: {CATEGORIES['transport']}"), "Ошибка: потеряна категория страницы"
+    assert 'Обед' not in sent[-1], "Ошибка: в истории категории трата из другой категории"
+    
+    all_categories = bot.get_expenses_page(test_user_id, limit=20)
+    assert len(all_categories['rows']) == 8 and not all_categories['has_older'], "Ошибка: история всех категорий"
+    
+    bot.delete_all_expenses(test_user_id)
+    print("   ✅ История работает")
+
+def test_budgets():
+    """Тест бюджетов и накопительных сумм за месяц"""
+    print("\n🎯 Проверка бюджетов:")
+    bot = ExpenseBot()
+    test_user_id = 78901
+    
+    bot.set_budget(test_user_id, 'food_out', 1000.0)
+    assert bot.get_budget_status(test_user_id, 'food_out') == (1000.0, 0), "Ошибка: пустой бюджет"
+    
+    bot.add_expense(test_user_id, 'food_out', 'Обед', 700.0)
+    bot.add_expense(test_user_id, 'food_out', 'Ужин', 150.0)
+    limit, spent = bot.get_budget_status(test_user_id, 'food_out')
+    print(f"   Потрачено {spent} из {limit} ₽")
+    assert spent == 850.0, "Ошибка: накопительная сумма не совпадает"
+    assert budget_threshold_crossed(limit, spent, 150.0) == 80, "Ошибка: порог 80% не найден"
+    assert budget_threshold_crossed(limit, 1200.0, 350.0) == 100, "Ошибка: порог 100% не найден"
+    assert budget_threshold_crossed(limit, 1300.0, 100.0) is None, "Ошибка: порог уже был пройден"
+    
+    expense_id = bot.get_expenses_page(test_user_id, 'food_out')['rows'][0][0]
+    bot.delete_expense(expense_id, test_user_id)
+    assert bot.get_budget_status(test_user_id, 'food_out')[1] == 700.0, "Ошибка: сумма не уменьшилась"
+    assert bot.get_monthly_total(test_user_id) == 700.0, "Ошибка: сумма за месяц"
+    assert bot.get_budgets_status(test_user_id) == [('food_out', 1000.0, 700.0)]
+    
+    bot.set_budget(test_user_id, 'food_out', 0)
+    assert bot.get_budget_status(test_user_id, 'food_out') is None, "Ошибка: бюджет не удалён"
+    bot.delete_all_expenses(test_user_id)
+    print("   ✅ Бюджеты работают")
+
+def test_recurring():
+    """Тест регулярных трат и планировщика"""
+    print("\n🔁 Проверка регулярных трат:")
+    bot = ExpenseBot()
+    test_user_id = 89012
+    
+    # Ежемесячное списание 31-го числа не «сползает» на 28-е
+    due = next_recurring_due(datetime(2025, 1, 31, 9), 'monthly', 31)
+    assert due == datetime(2025, 2, 28, 9), "Ошибка: короткий месяц"
+    assert next_recurring_due(due, 'monthly', 31) == datetime(2025, 3, 31, 9), "Ошибка: возврат к 31-му"
+    assert next_recurring_due(due, 'weekly', 31) == datetime(2025, 3, 7, 9), "Ошибка: еженедельное списание"
+    
+    now = datetime.now()
+    rule_id, _ = bot.add_recurring(
+        test_user_id, 'subscriptions', 'Netflix', 599.0, 'weekly', now - timedelta(days=15)
+    )
+    
+    # Планировщик догоняет пропущенные сроки после простоя
+    scheduler = RecurringScheduler(bot)
+    stale_scheduler = RecurringScheduler(bot)
+    asyncio.run(stale_scheduler.load())
+    created = asyncio.run(scheduler.tick(now))
+    print(f"   Добавлено трат: {len(created)}")
+    assert len(created) == 3, "Ошибка: должно быть 3 списания (15 дней назад, 8 дней назад, вчера)"
+    
+    # Повторный запуск (в том числе с устаревшей очередью) не создаёт дубликатов
+    assert asyncio.run(scheduler.tick(now)) == [], "Ошибка: повторный шаг создал траты"
+    assert asyncio.run(stale_scheduler.tick(now)) == [], "Ошибка: дубликаты при устаревшей очереди"
+    assert bot.search_expenses(test_user_id, 'netflix')['count'] == 3, "Ошибка: число трат в базе"
+    
+    rules = bot.get_recurring_rules(test_user_id, 'subscriptions')
+    assert len(rules) == 1 and rules[0][4] > now.strftime('%Y-%m-%d %H:%M:%S'), "Ошибка: срок не сдвинут"
+    
+    # Правило, появившееся в базе в обход планировщика (например, после /restore
+    # в другом процессе), подхватывается при плановой перестройке очереди
+    other_rule_id, _ = bot.add_recurring(
+        test_user_id, 'subscriptions', 'Музыка', 199.0, 'monthly', now - timedelta(hours=1)
+    )
+    assert asyncio.run(scheduler.tick(now)) == [], "Ошибка: очередь должна обновляться только по расписанию"
+    scheduler.loaded_at -= RECURRING_RELOAD_SECONDS
+    assert len(asyncio.run(scheduler.tick(now))) == 1, "Ошибка: правило не подхвачено при перестройке"
+    
+    # Правило, добавленное во время перестройки, не теряется вместе со старой очередью
+    async def reload_with_new_rule():
+        loading = asyncio.create_task(scheduler.load())
+        await asyncio.sleep(0)
+        scheduler.schedule(other_rule_id + 1000, '2000-01-01 09:00:00')
+        await loading
+    
+    asyncio.run(reload_with_new_rule())
+    assert ('2000-01-01 09:00:00', other_rule_id + 1000) in scheduler.heap, "Ошибка: правило потеряно при перестройке"
+    
+    # Кнопка удаления работает и без сохранённой категории (после перезапуска)
+    sent = asyncio.run(run_dialog(test_user_id, [('cb', f'recurring_del_subscriptions_{other_rule_id}')]))
+    assert sent[-1].startswith('🗑️ Регулярная трата удалена'), f"Ошибка: нет ответа на удаление: {sent[-1]}"
+    assert len(bot.get_recurring_rules(test_user_id, 'subscriptions')) == 1, "Ошибка: правило не удалено"
+    
+    assert bot.delete_recurring(rule_id, test_user_id), "Ошибка: правило не удалено"
+    assert asyncio.run(scheduler.tick(now + timedelta(days=30))) == [], "Ошибка: удалённое правило сработало"
+    
+    # Первое списание не раньше чем на период назад: давние даты не пишут траты задним числом
+    last_week = (now - timedelta(days=6)).strftime('%d.%m.%Y')
+    sent = asyncio.run(run_dialog(test_user_id, [
+        ('cb', 'category_subscriptions'), ('cb', 'recurring'), ('cb', 'recurring_add'),
+        ('text', 'Спортзал'), ('text', '1500'), ('cb', 'recurring_sched_weekly'),
+        ('text', '01.01.2000'), ('text', last_week)
+    ]))
+    assert sent[-2].startswith('⚠️ Дата слишком давняя'), f"Ошибка: давняя дата принята: {sent[-2]}"
+    assert sent[-1].startswith('🔁 Регулярная трата «Спортзал»'), f"Ошибка: дата отклонена: {sent[-1]}"
+    gym = [rule for rule in bot.get_recurring_rules(test_user_id, 'subscriptions') if rule[1] == 'Спортзал']
+    assert len(gym) == 1, "Ошибка: правило не создано"
+    bot.delete_recurring(gym[0][0], test_user_id)
+    
+    # Сводка после долгого простоя укладывается в лимит Telegram на длину сообщения
+    items = [('Подписка на онлайн-кинотеатр', 599.0, '2025-01-01 09:00:00')] * 366 * 2
+    summary = format_recurring_summary(items)
+    assert len(summary) <= 4096, f"Ошибка: сводка длиной {len(summary)} символов"
+    assert summary.endswith(f"Всего: {len(items)} на {599 * len(items)} ₽"), "Ошибка: нет итога"
+    assert 'и ещё' not in format_recurring_summary(items[:3]), "Ошибка: короткая сводка обрезана"
+    
+    bot.delete_all_expenses(test_user_id)
+    print("   ✅ Регулярные траты работают")
+
+def test_conversation_cancel():
+    """Отменённый разговор не должен перехватывать ввод следующего"""
+    print("\n💬 Проверка отмены разговоров:")
+    bot = ExpenseBot()
+    test_user_id = 90123
+    
+    sent = asyncio.run(run_dialog(test_user_id, [
+        ('cb', 'search'), ('cb', 'back_to_main'),
+        ('cb', 'category_food_out'), ('cb', 'set_budget'), ('text', '15000')
+    ]))
+    assert sent[-1].startswith('🎯 Бюджет'), f"Ошибка: ввод бюджета ушёл в поиск: {sent[-1]}"
+    assert bot.get_budget_status(test_user_id, 'food_out') == (15000.0, 0)
+    
+    sent = asyncio.run(run_dialog(test_user_id, [
+        ('cb', 'category_food_out'), ('cb', 'add_expense'), ('cb', 'back'),
+        ('cb', 'search'), ('text', 'Netflix')
+    ]))
+    assert sent[-1].startswith('🔍 Поиск'), f"Ошибка: поисковый запрос ушёл в название траты: {sent[-1]}"
+    
+    # Новый диалог, начатый кнопкой из старого меню, завершает начатый
+    sent = asyncio.run(run_dialog(test_user_id, [
+        ('cb', 'search'), ('cb', 'category_food_out'), ('cb', 'set_budget'), ('text', '20000')
+    ]))
+    assert sent[-1].startswith('🎯 Бюджет'), f"Ошибка: ввод бюджета ушёл в поиск: {sent[-1]}"
+    assert bot.get_budget_status(test_user_id, 'food_out') == (20000.0, 0)
+    
+    sent = asyncio.run(run_dialog(test_user_id, [
+        ('cb', 'category_food_out'), ('cb', 'add_expense'), ('cb', 'search'), ('text', 'Netflix')
+    ]))
+    assert sent[-1].startswith('🔍 Поиск'), f"Ошибка: поисковый запрос ушёл в название траты: {sent[-1]}"
+    
+    bot.set_budget(test_user_id, 'food_out', 0)
+    print("   ✅ Отмена разговоров работает")
+
+def test_worker_routing():
+    """Маршрутизация по процессам и деление регулярных трат используют одно соответствие"""
+    print("\n🔀 Проверка распределения пользователей по процессам:")
+    workers = 4
+    user_ids = [1, 5, 12345, 987654321, 23456, 67890]
+    
+    for user_id in user_ids:
+        index = worker_for_user(user_id, workers)
+        assert 0 <= index < workers, "Ошибка: номер процесса вне диапазона"
+        assert worker_for_user(user_id, workers) == index, "Ошибка: соответствие не постоянно"
+        owners = [
+            shard for shard in range(workers)
+            if RecurringScheduler(None, shard=shard, shards=workers).owns(user_id)
+        ]
+        assert owners == [index], "Ошибка: правила пользователя ведёт не его процесс"
+    
+    class ListQueue(list):
+        put = list.append
+    
+    queues = [ListQueue() for _ in range(workers)]
+    context = type('Context', (), {'bot_data': {'worker_queues': queues}})()
+    for number, user_id in enumerate(user_ids, start=1):
+        update = Update.de_json({'update_id': number, 'message': {
+            'message_id': number, 'date': 0, 'text': 'привет',
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': {'id': user_id, 'is_bot': False, 'first_name': 'Тест'}
+        }}, None)
+        asyncio.run(route_update(update, context))
+        assert queues[worker_for_user(user_id, workers)][-1]['update_id'] == number, "Ошибка: не та очередь"
+    
+    assert sum(len(queue) for queue in queues) == len(user_ids)
+    print("   ✅ Распределение работает")
+
 def test_categories():
     """Тест категорий"""
     print("\n📂 Проверка категорий:")
@@ -124,6 +546,14 @@ if __name__ == '__main__':
     try:
         test_categories()
         test_expense_bot()
+        test_search()
+        test_suggestions()
+        test_backup_restore()
+        test_history_pages()
+        test_budgets()
+        test_recurring()
+        test_conversation_cancel()
+        test_worker_routing()
         
         print("\n" + "=" * 50)
         print("🎯 РЕЗУЛЬТАТ: Все тесты пройдены успешно!")